@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+'''
+pandas accessor for evaluating tables of cell designs.
+
+Importing this module registers df.wattcell. Every row of the DataFrame is
+one design, columns with dotted field names as in the results (in the
+units of the model, e.g. cathode.thickness in cm) and material names from
+data.materials (e.g. cathode.active_material) set its inputs:
+
+    import accessor
+
+    designs = pd.DataFrame({
+        'cathode.active_material': ['NMC811', 'LFP'],
+        'cathode.thickness': [80e-4, 120e-4],
+        'layers_number': [30, 25],
+    })
+    results = designs.wattcell.evaluate(format='pouch')
+
+Inputs without a column keep the values of the base cell, by default the
+design the app starts with. For pouch cells the anode, separator and pouch
+follow the cathode dimensions as in the app, unless they have columns too.
+All rows are evaluated at once in vectorised passes and the metrics are
+returned with the index of the DataFrame.
+'''
+
+import numpy as np
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, chunk_size_for_budget, chunk_slices
+from cell_components import (
+    Cell,
+    Cylindrical,
+    Electrode,
+    Electrolyte,
+    Pouch,
+    Prismatic,
+    Separator,
+    Tab,
+    materials,
+)
+from dataset import MATERIAL_FIELDS, OUTPUTS, evaluate_samples
+from sensitivity import numeric_inputs
+from variants import variant_cell
+
+FORMATS = ['pouch', 'cylindrical', 'prismatic']
+STRUCTURES = ['Wound', 'Z-stacked']
+COMPONENTS = ['cathode', 'anode', 'separator', 'electrolyte', 'format', 'tabs']
+
+# inputs of anode free cells in the app, used unless they have columns
+ANODE_FREE_INPUTS = {
+    'n_p_ratio': 1,
+    'anode.porosity': 0,
+    'anode.mass_ratio.am': 1,
+    'anode.mass_ratio.carbon': 0,
+    'anode.mass_ratio.binder': 0,
+}
+
+# pouch dimension: (dimension it follows, offset in cm), as in the app
+POUCH_GEOMETRY = {
+    'anode.width': ('cathode.width', 0.2),
+    'anode.height': ('cathode.height', 0.2),
+    'separator.width': ('anode.width', 0),
+    'separator.height': ('anode.height', 0.2),
+    'format.width': ('separator.width', materials['formats']['pouch']['extra_width']),
+    'format.height': ('separator.height', materials['formats']['pouch']['extra_height']),
+}
+
+
+def default_cell(cell_format='pouch', structure='Wound'):
+    '''Cell with the default inputs of the app for the format'''
+    cell_format = cell_format.lower()
+    if cell_format not in FORMATS:
+        raise ValueError(f'Unknown cell format: {cell_format}')
+
+    cathode_am = next(iter(materials['cathodes']))
+    anode_am = next(iter(materials['anodes']))
+    binders = list(materials['binders'])
+    collector = next(iter(materials['current_collectors']))
+    width, height = (15, 40) if cell_format == 'pouch' else (0, 0)
+    cathode = Electrode(
+        active_material=cathode_am,
+        mass_ratio={'am': 0.95, 'carbon': 0.02, 'binder': 0.03},
+        binder=binders[0],
+        porosity=0.25,
+        voltage=materials['cathodes'][cathode_am]['voltage'],
+        capacity=materials['cathodes'][cathode_am]['capacity'],
+        density_am=materials['cathodes'][cathode_am]['density'],
+        width=width,
+        height=height,
+        thickness=80 / 10000,
+        current_collector=collector,
+        cc_thickness=materials['current_collectors'][collector]['thickness'] / 10000,
+    )
+    anode = Electrode(
+        active_material=anode_am,
+        mass_ratio={'am': 0.96, 'carbon': 0.02, 'binder': 0.02},
+        binder=binders[1],
+        porosity=0.25,
+        voltage=materials['anodes'][anode_am]['voltage'],
+        capacity=materials['anodes'][anode_am]['capacity'],
+        density_am=materials['anodes'][anode_am]['density'],
+        width=cathode.width + 0.2,
+        height=cathode.height + 0.2,
+        current_collector=collector,
+        cc_thickness=materials['current_collectors'][collector]['thickness'] / 10000,
+    )
+    separator_name = next(iter(materials['separators']))
+    separator = Separator(
+        material=separator_name,
+        width=anode.width,
+        height=anode.height + 0.2,
+        thickness=materials['separators'][separator_name]['thickness'] / 10000,
+        porosity=materials['separators'][separator_name]['porosity'],
+        density=materials['separators'][separator_name]['density'],
+    )
+    electrolyte_name = next(iter(materials['electrolytes']))
+    electrolyte = Electrolyte(
+        material=electrolyte_name,
+        density=materials['electrolytes'][electrolyte_name]['density'],
+    )
+    tab_material = next(iter(materials['tabs']))
+
+    layers_number = None
+    if cell_format == 'pouch':
+        pouch = materials['formats']['pouch']
+        case = Pouch(
+            width=separator.width + pouch['extra_width'],
+            height=separator.height + pouch['extra_height'],
+            thickness=pouch['thickness'] / 10000,
+            density=pouch['density'],
+        )
+        tabs = Tab(tab_material, tab_material, height=2, width=5, thickness=0.05)
+        layers_number = 30
+    elif cell_format == 'cylindrical':
+        size = next(iter(materials['formats']['cylindrical'].values()))
+        case = Cylindrical(
+            diameter=size['diameter'] / 10,
+            height=size['height'] / 10,
+            can_thickness=size['can_thickness'] / 10,
+            can_density=materials['can_density']['Stainless steel'],
+            mandrel_diam=size['mandrel_dia'] / 10,
+            headspace=size['headspace'] / 10,
+        )
+        tabs = Tab()
+    else:
+        case = Prismatic(
+            structure=structure,
+            width=17.3,
+            height=11.5,
+            depth=4.5,
+            can_thickness=0.11,
+            can_density=materials['can_density']['Aluminium'],
+            headspace=0.5,
+        )
+        tabs = Tab(tab_material, tab_material, height=2, width=3, thickness=0.05)
+
+    return Cell(
+        cathode, anode, separator, electrolyte, case, tabs, layers_number,
+        n_p_ratio=1.1, ice=0.93, extra_mass=3,
+    )
+
+
+def format_name(cell):
+    return type(cell.format).__name__.lower()
+
+
+@pd.api.extensions.register_dataframe_accessor('wattcell')
+class WattCellAccessor:
+    def __init__(self, df):
+        self._df = df
+
+    def inputs(self, format=None, base=None):
+        '''Columns used as inputs of the cell, other columns are ignored.
+        Raises ValueError for columns of components that are not inputs.'''
+        base = base if base is not None else default_cell(format or 'pouch')
+        numeric = {name for name, _, _ in numeric_inputs(base)}
+        used = []
+        for column in self._df.columns:
+            name = str(column)
+            if name in numeric or name in MATERIAL_FIELDS:
+                used.append(column)
+            elif name == 'format.structure' and format_name(base) == 'prismatic':
+                used.append(column)
+            elif name.split('.')[0] in COMPONENTS:
+                raise ValueError(f'{name} is not an input of {format_name(base)} cells')
+        return used
+
+    def evaluate(
+        self, format=None, base=None, anodefree=False, outputs=OUTPUTS,
+        memory_budget=DEFAULT_MEMORY_BUDGET
+    ):
+        '''
+        Evaluates every row as a design of the format ('pouch', 'cylindrical'
+        or 'prismatic') or as a variant of the base cell. outputs are dotted
+        names of results, e.g. anode.thickness or mass_breakdown.casing.
+        Returns the outputs and a feasible column with the index of the
+        DataFrame.
+        '''
+        if base is None:
+            base = default_cell(format or 'pouch')
+        elif format is not None and format.lower() != format_name(base):
+            raise ValueError(f'Base cell is {format_name(base)}, not {format}')
+        df = self._df
+        columns = self.inputs(format_name(base), base)
+
+        values = {}
+        inputs = {}
+        for column in columns:
+            name = str(column)
+            if name == 'format.structure':
+                continue
+            if name in MATERIAL_FIELDS:
+                table = materials[MATERIAL_FIELDS[name][0]]
+                names = df[column]
+                unknown = sorted(set(names.dropna().astype(str)) - set(table))
+                if unknown or names.isna().any():
+                    raise ValueError(
+                        f'Unknown materials in {name}: {", ".join(unknown) or "missing values"}'
+                    )
+                categories = list(table)
+                values[name] = pd.Categorical(names, categories).codes.astype(np.int32)
+                inputs[name] = {'kind': 'categorical', 'categories': categories}
+            else:
+                values[name] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+                inputs[name] = {'kind': 'numeric'}
+
+        if anodefree:
+            for name, value in ANODE_FREE_INPUTS.items():
+                if name not in values:
+                    values[name] = np.full(len(df), float(value))
+                    inputs[name] = {'kind': 'numeric'}
+        if format_name(base) == 'pouch':
+            for name, (source, offset) in POUCH_GEOMETRY.items():
+                if name not in values and source in values:
+                    values[name] = values[source] + offset
+                    inputs[name] = {'kind': 'numeric'}
+
+        if 'format.structure' in columns:
+            structures = df['format.structure'].to_numpy()
+            unknown = sorted(set(map(str, structures)) - set(STRUCTURES))
+            if unknown:
+                raise ValueError(f'Unknown cell structures: {", ".join(unknown)}')
+        else:
+            structures = np.full(len(df), getattr(base.format, 'structure', None))
+
+        results = {name: np.empty(len(df)) for name in outputs}
+        results['feasible'] = np.empty(len(df), dtype=bool)
+        chunk_size = chunk_size_for_budget(memory_budget)
+        # the structure selects different calculations, so evaluate it in groups
+        for structure in pd.unique(structures):
+            rows = np.flatnonzero(structures == structure)
+            group_base = base
+            if structure is not None:
+                group_base = variant_cell(base, {'format.structure': structure})
+            for chunk in chunk_slices(len(rows), chunk_size):
+                selected = rows[chunk]
+                evaluated = evaluate_samples(
+                    group_base, {name: v[selected] for name, v in values.items()},
+                    inputs, anodefree, outputs, size=len(selected),
+                )
+                for name, value in evaluated.items():
+                    results[name][selected] = value
+        return pd.DataFrame(results, index=df.index)
@@ -7,6 +7,7 @@ Created on 27/07/2024
 '''
 
 # Import Python Libraries
+import numpy as np
 import pandas as pd
 import streamlit as st
 from cell_components import (
@@ -20,7 +21,28 @@ from cell_components import (
     Tab,
     Cell,
 )
-from graphs import generate_energy_density_data, plot_energy_density
+from graphs import (
+    plot_breakdown,
+    plot_cycle_life,
+    plot_energy_density,
+    plot_format_comparison,
+    plot_form_factor_map,
+    plot_lifetime_energy,
+    plot_lot_distribution,
+)
+from cache import ResultCache, cell_state, hash_state
+from comparison import compare_formats
+from cycle_life import FADE_MODELS, project_cell, project_designs
+from store import ResultsStore
+from surrogate import AXES, build_table, load_table, preview_sweep, save_table, table_key
+from jobs import SweepJob
+from metrics import serve_from_env
+from explorer import generate_cylindrical_map, generate_prismatic_map
+from pack import Pack, cell_metrics, evaluate_packs, size_packs, topologies
+from sensitivity import elasticities
+from singleflight import FLIGHTS
+from validation import summary, validate, validate_cell
+from variability import Variability, is_stacked, simulate_lot
 
 config = {'displaylogo': False}
 
@@ -52,6 +74,29 @@ def page_config():
     )
 
 
+@st.cache_resource
+def get_result_cache():
+    '''One on-disk cache shared by all sessions'''
+    return ResultCache()
+
+
+@st.cache_resource
+def get_results_store():
+    return ResultsStore()
+
+
+@st.cache_resource
+def get_surrogate_table(key):
+    '''Lookup tables are loaded once and shared by all sessions'''
+    return load_table(key)
+
+
+@st.cache_resource
+def start_metrics_server():
+    '''Opt-in metrics endpoint, started once if WATTCELL_METRICS_PORT is set'''
+    return serve_from_env()
+
+
 def read_file(name):
     with open(name, "r") as file:
         text = file.read()
@@ -61,6 +106,45 @@ def read_file(name):
 def design_cell():
 
     st.header('Cell Properties:')
+
+    # format and anode free change the layout of the inputs, so they apply at once
+    f1, f2 = st.columns(2)
+    with f1:
+        st.radio(
+            'Cell Format',
+            ['Pouch', 'Cylindrical', 'Prismatic'],
+            key='cell_format',
+            on_change=set_cell_format,
+            horizontal=True
+            )
+    with f2:
+        st.checkbox(
+            'Anode free cell',
+            key='anode_free',
+            on_change=is_anode_free,
+            help='''
+            Will set n/p to 1,
+            porosity of anode to 0% and anode AM mass ratio to 100%. 
+            User still has to select correct Anode active material 
+            (Li or Na metal).
+            ''',
+        )
+
+    batch_inputs = st.sidebar.toggle(
+        'Apply input changes together', value=True,
+        help='Changes of the cell inputs are applied with the Update cell button, '
+        'instead of rerunning the app on every change'
+    )
+    if not batch_inputs:
+        return cell_inputs()
+    with st.form('cell_inputs', border=False):
+        cell = cell_inputs()
+        st.form_submit_button('Update cell', type='primary')
+    return cell
+
+
+def cell_inputs():
+    anode_free = st.session_state.anode_free
     c1, c2, c3, c4 = st.columns(4)
 
     # collect user inputs
@@ -279,28 +363,9 @@ def design_cell():
     with c4:
         st.write('### Cell Configuration:')
 
-        cell_format_selector = st.radio(
-            'Cell Format',
-            ['Pouch', 'Cylindrical', 'Prismatic'],
-            key='cell_format',
-            on_change=set_cell_format,
-            horizontal=True
-            )
         if st.session_state.cell_format == 'Prismatic':
-            structure = st.radio('Cell structure', ['Wound', 'Z-stacked'], label_visibility='hidden')
-        '---'
-
-        anode_free = st.checkbox(
-            'Anode free cell',
-            key='anode_free',
-            on_change=is_anode_free,
-            help='''
-            Will set n/p to 1,
-            porosity of anode to 0% and anode AM mass ratio to 100%. 
-            User still has to select correct Anode active material 
-            (Li or Na metal).
-            ''',
-        )
+            structure = st.radio('Cell structure', ['Wound', 'Z-stacked'])
+            '---'
         if st.session_state.cell_format == 'Pouch':
             layers_number = st.slider('Number of layers', 1, 40, value=30, step=1)
         cell_t_placeholder = st.empty()  # placeholder to insert calculated thickness
@@ -483,21 +548,47 @@ def recalculate_anodefree_energy(cell):
     cell.anode_free_energy()
 
 
+@st.fragment
 def print_cell_metrics(cell):
+    '''Reruns on its own, must be called inside st.sidebar'''
+    st.write('# Calculated Cell Performance:')
 
-    with st.sidebar:
-        st.write('# Calculated Cell Performance:')
+    st.metric('Total Mass', f'{cell.total_mass:.2f} g')
+    st.metric('Total Volume', f'{cell.total_volume:.2f} cm³')
 
-        st.metric('Total Mass', f'{cell.total_mass:.2f} g')
-        st.metric('Total Volume', f'{cell.total_volume:.2f} cm³')
+    st.metric('Capacity', f'{cell.capacity:.2f} Ah')
+    st.metric('Energy', f'{cell.energy:.2f} Wh')
 
-        st.metric('Capacity', f'{cell.capacity:.2f} Ah')
-        st.metric('Energy', f'{cell.energy:.2f} Wh')
+    st.metric('Specific Energy', f'{cell.gravimetric_energy_density:.1f} Wh/kg')
+    st.metric('Energy Density', f'{cell.volumetric_energy_density:.1f} Wh/L')
 
-        st.metric('Specific Energy', f'{cell.gravimetric_energy_density:.1f} Wh/kg')
-        st.metric('Energy Density', f'{cell.volumetric_energy_density:.1f} Wh/L')
+    with st.expander('What moves the needle'):
+        metrics = {
+            'Specific Energy': 'gravimetric_energy_density',
+            'Energy Density': 'volumetric_energy_density',
+            'Capacity': 'capacity',
+            'Total Mass': 'total_mass',
+        }
+        report = validate_cell(cell)
+        if not report['feasible'].iloc[0]:
+            failed = summary(report).query('designs > 0')
+            st.info(
+                'Inputs can only be ranked for a feasible design: '
+                f'{"; ".join(failed["reason"].str.lower())}'
+            )
+            return
+        metric = st.selectbox('Rank inputs by', metrics.keys())
+        # relative change of the metric for +1 % of each input
+        drivers = elasticities(cell, st.session_state.anode_free, [metrics[metric]])
+        drivers = drivers[metrics[metric]]
+        top = drivers.abs().sort_values(ascending=False).index[:8]
+        st.dataframe(
+            drivers[top].round(3).rename('Change (%)'), use_container_width=True
+        )
+        st.caption(f'Change of the {metric.lower()} for a 1 % increase of each input.')
 
 
+@st.fragment
 def energy_density_graph(cell):
     st.header('Energy Density Graph')
     parameters = [
@@ -533,24 +624,429 @@ def energy_density_graph(cell):
         end = st.number_input('End value', value=100)
 
     steps = st.slider('Number of steps', min_value=10, max_value=100, value=50)
+    adaptive = st.checkbox(
+        'Adaptive sampling',
+        help='Places the steps where the curves bend instead of evenly, '
+        'may stop early once the curves are resolved'
+    )
+    preview = st.checkbox(
+        'Instant preview',
+        help='Interpolates the graph from a precomputed lookup table '
+        'until Generate Graph evaluates the exact model'
+    )
+
+    sweep = (parameter, start, end, steps, st.session_state.anode_free)
+    sweep_id = hash_state({'cell': cell_state(cell), 'sweep': sweep, 'adaptive': adaptive})
+    job = st.session_state.get('sweep_job')
+    if job is not None and st.session_state.get('sweep_id') != sweep_id:
+        # inputs have changed, so results of the last sweep are stale
+        job.cancel()
+        del st.session_state['sweep_job']
 
     if st.button('Generate Graph'):
-        df = generate_energy_density_data(
-            cell, parameter, start, end, steps, st.session_state.anode_free
+        if job is not None:
+            job.cancel()
+        st.session_state.sweep_job = SweepJob(
+            cell, *sweep, cache=get_result_cache(), adaptive=adaptive
+        ).start()
+        st.session_state.sweep_id = sweep_id
+
+    job = st.session_state.get('sweep_job')
+    if job is not None:
+        # poll the worker thread only while it is running
+        sweep_job_view_fragment = st.fragment(
+            sweep_job_view, run_every=0.5 if job.running else None
         )
+        sweep_job_view_fragment(job, polling=job.running)
+    elif preview:
+        surrogate_preview(cell, parameter, start, end, steps)
 
-        fig = plot_energy_density(df, parameter)
-        st.plotly_chart(fig, use_container_width=True)
 
+def surrogate_preview(cell, parameter, start, end, steps):
+    if parameter not in AXES:
+        st.info(f'No lookup table for {parameter.lower()}, generate the graph instead.')
+        return
+    key = table_key(cell, st.session_state.anode_free)
+    table = get_surrogate_table(key)
+    if table is None:
+        if not st.button('Precompute lookup table'):
+            return
+        # sessions asking for the same table at once share one build
+        FLIGHTS.do(key, build_and_save_table, cell, st.session_state.anode_free)
+        get_surrogate_table.clear()
+        table = get_surrogate_table(key)
+
+    df = preview_sweep(table, cell, parameter, start, end, steps)
+    st.plotly_chart(plot_energy_density(df, parameter), use_container_width=True)
+    error = max(
+        table.errors[metric]['max']
+        for metric in ['gravimetric_energy_density', 'volumetric_energy_density']
+    )
+    st.caption(
+        f'Preview interpolated from a lookup table, at most {error * 100:.2f} % off '
+        'the exact model. Values outside the table are left out.'
+    )
+
+
+def build_and_save_table(cell, anodefree):
+    return save_table(build_table(cell, anodefree))
+
+
+def sweep_job_view(job, polling):
+    if job.running:
+        st.progress(
+            job.progress, text=f'Evaluated {job.points_done} of {job.steps} points'
+        )
+        if st.button('Cancel'):
+            job.cancel()
+            job.wait()
+    elif polling:
+        # job has just finished, rerun the whole app to stop polling
+        st.rerun()
+
+    if job.error is not None:
+        st.error(f'Graph generation failed: {job.error}')
+    elif job.cancelled and not job.complete:
+        st.warning(f'Cancelled after {job.points_done} of {job.steps} points')
+    elif job.adaptive and job.complete:
+        st.caption(f'Adaptive sampling used {job.points_done} of {job.steps} points')
+
+    df = job.result()
+    if df.empty:
+        return
+
+    if not df['feasible'].all():
+        failed = summary(validate(df)).query('designs > 0')
+        st.warning(
+            f'{(~df["feasible"]).sum()} of {len(df)} designs are infeasible and '
+            f'left out of the graph: {"; ".join(failed["reason"].str.lower())}'
+        )
+
+    fig = plot_energy_density(df, job.parameter)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if job.complete:
         st.download_button(
             label='Download data as CSV',
             data=df.to_csv().encode('utf-8'),
-            file_name=f'energy_density_vs_{parameter}.csv',
+            file_name=f'energy_density_vs_{job.parameter}.csv',
             mime='text/csv',
         )
+        if st.button('Save to results store'):
+            get_results_store().write(df, study=job.parameter)
+            st.success(f'Saved {len(df)} designs')
+
+
+@st.fragment
+def cycle_life_view(cell):
+    st.header('Cycle Life Projection')
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        model = st.radio(
+            'Capacity fade', FADE_MODELS, index=1, horizontal=True,
+            help='Fade proportional to the cycle number or to its square root'
+        )
+        reference_cycles = st.number_input('Reference cycles', 1, value=1000)
+    with c2:
+        capacity_fade = st.slider(
+            'Capacity lost at reference cycles (%)', 0.0, 100.0, value=20.0
+        ) / 100
+        voltage_sag = st.number_input(
+            'Average voltage drop at reference cycles (V)', 0.0, value=0.05
+        )
+    with c3:
+        max_cycles = st.number_input('Projected cycles', 10, value=3000)
+        end_of_life = st.slider('End of life capacity (%)', 1, 100, value=80) / 100
+
+    fade = dict(
+        capacity_fade=capacity_fade, voltage_sag=voltage_sag,
+        model=model, reference_cycles=reference_cycles
+    )
+    cycles = np.arange(1, max_cycles + 1)
+    projection = project_cell(cell, cycles, **fade)
+    lifetime = projection.lifetime(end_of_life).iloc[0]
+
+    c1, c2 = st.columns(2)
+    c1.metric('Cycle Life', f'{lifetime.cycle_life:.0f} cycles')
+    c2.metric('Lifetime Energy Throughput', f'{lifetime.lifetime_energy / 1000:.2f} kWh')
+    st.plotly_chart(
+        plot_cycle_life(projection, ['Designed cell']), use_container_width=True
+    )
+
+    # compare all designs of a finished energy density sweep
+    job = st.session_state.get('sweep_job')
+    if job is not None and job.complete:
+        df = job.result()
+        df = df[df['feasible']].reset_index(drop=True)
+        lifetimes = project_designs(df, cycles, **fade).lifetime(end_of_life)
+        lifetimes[job.parameter] = df[job.parameter]
+        st.plotly_chart(
+            plot_lifetime_energy(lifetimes, job.parameter), use_container_width=True
+        )
+
+
+@st.fragment
+def format_comparison_view(cell):
+    st.header('Format Comparison')
+    st.write(
+        'The electrodes, separator and electrolyte of this design in every '
+        'format. Formats other than the current one use the default dimensions.'
+    )
+    table = compare_formats(cell, st.session_state.anode_free)
+    units = {
+        'gravimetric_energy_density': 'Wh/kg',
+        'volumetric_energy_density': 'Wh/L',
+        'energy': 'Wh',
+        'capacity': 'Ah',
+    }
+    metric = st.selectbox(
+        'Compare', list(units), format_func=lambda m: m.replace('_', ' ').capitalize(),
+        key='comparison_metric'
+    )
+    st.plotly_chart(
+        plot_format_comparison(table, metric, units[metric]), use_container_width=True
+    )
+    st.dataframe(table.T)
+
+
+@st.fragment
+def variability_view(cell):
+    st.header('Manufacturing Variability')
+    st.write(
+        'Every electrode sheet of every cell in the lot gets its own coating '
+        'deviations. A cell is limited by its weakest interfaces.'
+    )
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        cells = st.number_input('Cells in lot', 100, 100_000, value=10_000, step=1000)
+        seed = st.number_input('Random seed', 0, value=0)
+    with c2:
+        thickness = st.slider('Thickness deviation (%)', 0.0, 10.0, value=2.0) / 100
+    with c3:
+        porosity = st.slider('Porosity deviation (% points)', 0.0, 5.0, value=1.0) / 100
+    with c4:
+        loading = st.slider('Loading deviation (%)', 0.0, 10.0, value=1.0) / 100
+
+    variability = Variability(thickness, porosity, loading)
+    try:
+        lot = simulate_lot(cell, cells, variability, variability, seed)
+    except ValueError as e:
+        st.info(f'{e}, change the cell inputs to simulate a lot.')
+        return
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric(
+        'Mean Capacity', f'{lot.capacity.mean():.2f} Ah',
+        f'{lot.capacity.mean() - lot.nominal["capacity"]:.2f} Ah vs nominal'
+    )
+    c2.metric('Capacity Spread (1σ)', f'{lot.capacity.std():.3f} Ah')
+    c3.metric('Cells with local N/P < 1', f'{lot.low_n_p_share * 100:.1f} %')
+    st.plotly_chart(
+        plot_lot_distribution(lot, 'capacity', 'Capacity Distribution', 'Capacity (Ah)'),
+        use_container_width=True
+    )
+    st.dataframe(lot.summary())
+
+
+@st.fragment
+def form_factor_explorer(cell):
+    st.header('Form Factor Explorer')
+    if st.session_state.cell_format == 'Cylindrical':
+        col1, col2 = st.columns(2)
+        with col1:
+            diameters = st.slider('Diameter range (mm)', 10, 60, value=(18, 46))
+        with col2:
+            heights = st.slider('Height range (mm)', 40, 150, value=(65, 80))
+        grid_steps = st.slider('Grid points per dimension', 10, 200, value=50)
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            widths = st.slider('Width range (mm)', 20, 300, value=(100, 220))
+        with col2:
+            heights = st.slider('Height range (mm)', 20, 300, value=(80, 150))
+        with col3:
+            depths = st.slider('Depth range (mm)', 5, 100, value=(20, 60))
+        grid_steps = st.slider('Grid points per dimension', 5, 60, value=20)
+
+    metric = st.selectbox(
+        'Colour by',
+        [
+            'gravimetric_energy_density',
+            'volumetric_energy_density',
+            'energy',
+            'capacity',
+        ],
+        format_func=lambda m: m.replace('_', ' ').capitalize(),
+    )
+
+    design_id = hash_state(cell_state(cell))
+    if st.session_state.get('form_factor_id') != design_id:
+        # map of a different design is stale
+        st.session_state.form_factor_map = None
+
+    if st.button('Generate Map'):
+        # identical maps requested by other sessions at the same time are shared
+        if st.session_state.cell_format == 'Cylindrical':
+            grid = {
+                'diameters': np.linspace(*diameters, grid_steps),
+                'heights': np.linspace(*heights, grid_steps),
+            }
+            generate_map = generate_cylindrical_map
+        else:
+            grid = {
+                'widths': np.linspace(*widths, grid_steps),
+                'heights': np.linspace(*heights, grid_steps),
+                'depths': np.linspace(*depths, grid_steps),
+            }
+            generate_map = generate_prismatic_map
+        key = hash_state({
+            'design': design_id,
+            'map': generate_map.__name__,
+            'grid': cell_state(grid),
+            'anodefree': st.session_state.anode_free,
+        })
+        df, _ = FLIGHTS.do(
+            key, generate_map, cell, **grid, anodefree=st.session_state.anode_free
+        )
+        st.session_state.form_factor_map = df
+        st.session_state.form_factor_id = design_id
+
+    df = st.session_state.get('form_factor_map')
+    if df is None:
+        return
+
+    if 'Diameter (mm)' in df:
+        fig = plot_form_factor_map(df, 'Diameter (mm)', 'Height (mm)', metric)
+    elif 'Depth (mm)' in df:
+        # show one slice of the width x height x depth grid at a time
+        col1, col2 = st.columns(2)
+        with col1:
+            structure = st.radio(
+                'Structure', df['Structure'].unique(), horizontal=True
+            )
+        with col2:
+            depth = st.select_slider(
+                'Depth (mm)', np.unique(df['Depth (mm)']),
+                format_func=lambda d: f'{d:.1f}'
+            )
+        selected = df[(df['Structure'] == structure) & (df['Depth (mm)'] == depth)]
+        fig = plot_form_factor_map(selected, 'Width (mm)', 'Height (mm)', metric)
+    else:
+        return
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.download_button(
+        label='Download map as CSV',
+        data=df.to_csv().encode('utf-8'),
+        file_name='form_factor_map.csv',
+        mime='text/csv',
+    )
+
+
+@st.fragment
+def pack_builder(cell):
+    st.header('Pack Builder')
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        size_to_target = st.checkbox(
+            'Size pack to target', value=True,
+            help='Calculate series and parallel cell count from target voltage and energy'
+        )
+        if size_to_target:
+            target_voltage = st.number_input(
+                'Target pack voltage (V)', 0.0, value=400.0,
+                help='0 means no target, all cells in parallel'
+            ) or None
+            target_energy = st.number_input(
+                'Target pack energy (kWh)', 0.0, value=75.0,
+                help='0 means no target, one cell in parallel'
+            ) * 1000 or None
+        else:
+            series = st.number_input('Cells in series', 1, value=100)
+            parallel = st.number_input('Cells in parallel', 1, value=1)
+            target_voltage = target_energy = None
+        cells_per_module = st.number_input('Cells per module', 1, value=12)
+    with c2:
+        cell_overhead_mass = st.number_input('Overhead mass per cell (g)', 0.0, value=0.0)
+        module_overhead_mass = st.number_input('Overhead mass per module (g)', 0.0, value=0.0)
+        pack_overhead_mass = st.number_input('Pack overhead mass (kg)', 0.0, value=0.0) * 1000
+    with c3:
+        cell_overhead_volume = st.number_input('Overhead volume per cell (cm³)', 0.0, value=0.0)
+        module_overhead_volume = st.number_input('Overhead volume per module (cm³)', 0.0, value=0.0)
+        pack_overhead_volume = st.number_input('Pack overhead volume (L)', 0.0, value=0.0) * 1000
+
+    overheads = dict(
+        cells_per_module=cells_per_module,
+        cell_overhead_mass=cell_overhead_mass,
+        cell_overhead_volume=cell_overhead_volume,
+        module_overhead_mass=module_overhead_mass,
+        module_overhead_volume=module_overhead_volume,
+        pack_overhead_mass=pack_overhead_mass,
+        pack_overhead_volume=pack_overhead_volume,
+    )
+    cells = cell_metrics([cell])
+    if size_to_target:
+        if target_voltage is None and target_energy is None:
+            st.info('Set a target voltage or energy to size the pack.')
+            return
+        try:
+            packs = size_packs(cells, target_voltage, target_energy, **overheads)
+        except ValueError:
+            st.warning('This cell has no usable voltage or energy, so no pack can be sized.')
+            return
+    else:
+        packs = [Pack(series, parallel, **overheads)]
+    pack = evaluate_packs(cells, topologies(packs), paired=True).iloc[0]
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric('Configuration', f'{pack.series:.0f}s{pack.parallel:.0f}p')
+    c1.metric('Cells / Modules', f'{pack.cells_number:.0f} / {pack.modules_number:.0f}')
+    c2.metric('Pack Voltage', f'{pack.voltage:.1f} V')
+    c2.metric('Pack Energy', f'{pack.energy / 1000:.2f} kWh')
+    c3.metric('Pack Mass', f'{pack.total_mass / 1000:.1f} kg')
+    c3.metric('Pack Volume', f'{pack.total_volume / 1000:.1f} L')
+    c4.metric('Pack Specific Energy', f'{pack.gravimetric_energy_density:.1f} Wh/kg')
+    c4.metric('Pack Energy Density', f'{pack.volumetric_energy_density:.1f} Wh/L')
+
+
+def stored_designs_view():
+    st.header('Stored Designs')
+    store = get_results_store()
+    if 'gravimetric_energy_density' not in store.columns():
+        st.info('No designs stored yet. Save a generated graph to add its designs.')
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        study = st.selectbox('Study', ['All'] + store.studies())
+    with c2:
+        min_specific_energy = st.number_input('Min. specific energy (Wh/kg)', 0.0, value=0.0)
+    with c3:
+        max_thickness = st.number_input(
+            'Max. cell thickness (mm)', 0.0, value=0.0, help='0 means no limit'
+        )
+    with c4:
+        max_electrolyte = st.number_input(
+            'Max. electrolyte (mL/Ah)', 0.0, value=0.0, help='0 means no limit'
+        )
+
+    where = [('gravimetric_energy_density', '>=', min_specific_energy)]
+    if study != 'All':
+        where.append(('study', '=', study))
+    if max_thickness:
+        where.append(('total_thickness', '<=', max_thickness))
+    if max_electrolyte:
+        where.append(('electrolyte.volume_per_ah', '<=', max_electrolyte))
+
+    st.write(f'{store.count(where)} matching designs, best 1000 shown:')
+    st.dataframe(
+        store.query(where, order_by='gravimetric_energy_density', limit=1000),
+        use_container_width=True
+    )
 
 
 page_config()
+start_metrics_server()
 
 st.title('WattCell')
 '---'
@@ -558,12 +1054,43 @@ st.title('WattCell')
 # st.markdown(ABOUT)
 
 battery = design_cell()
-print_cell_metrics(battery)
+with st.sidebar:
+    print_cell_metrics(battery)
 with st.expander('Designed cell - all data'):
     df = pd.DataFrame([battery])
     st.dataframe(df, use_container_width=True)
+with st.expander('Mass and volume breakdown'):
+    c1, c2 = st.columns(2)
+    c1.plotly_chart(
+        plot_breakdown(battery.mass_breakdown, 'Mass by component', 'Mass (g)'),
+        use_container_width=True
+    )
+    c2.plotly_chart(
+        plot_breakdown(battery.volume_breakdown, 'Volume by component', 'Volume (cm³)'),
+        use_container_width=True
+    )
 
 '---'
 energy_density_graph(battery)
 
+'---'
+cycle_life_view(battery)
+
+'---'
+format_comparison_view(battery)
+
+if is_stacked(battery) and not st.session_state.anode_free:
+    '---'
+    variability_view(battery)
+
+if st.session_state.cell_format in ['Cylindrical', 'Prismatic']:
+    '---'
+    form_factor_explorer(battery)
+
+'---'
+pack_builder(battery)
+
+'---'
+stored_designs_view()
+
 
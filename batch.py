@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+'''
+Helpers for evaluating cells in memory-budgeted, vectorised chunks.
+
+A Cell can be evaluated with numpy arrays in place of scalar inputs, so a
+chunk of design points costs a single pass through the model. The size of
+the chunks is chosen from a memory budget and the measured peak memory of
+one design point. The budget bounds the evaluation of a chunk, results
+that are kept in memory come on top of it.
+
+Precision
+---------
+'float64' (default) is exact to the model. 'float32' halves the memory of
+every array. Inputs are rounded to float32 (relative error 6e-8) and every
+step of the calculation adds at most the same again. The longest chain in
+the model has fewer than 40 operations, which bounds the relative error of
+the energy densities, capacity and mass at about 5e-6 against float64;
+sweeps of every format measure below 1e-6. Where the geometry nearly
+cancels, for example a jelly roll only slightly longer than the separator
+turns, the error of the derived electrode lengths grows with the
+cancellation. Use precision_error to measure the actual error of a study.
+'''
+
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+import pandas as pd
+
+PRECISIONS = {
+    'float64': np.float64,
+    'float32': np.float32,
+}
+
+# peak memory (bytes) of evaluating one design point, measured with
+# tracemalloc across all formats, including its row of the flattened output
+BYTES_PER_POINT = {
+    'float64': 2600,
+    'float32': 1500,
+}
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # 256 MB
+
+
+def chunk_size_for_budget(memory_budget, precision='float64'):
+    '''Number of design points that can be evaluated at once
+    within a memory budget (bytes)'''
+    return max(1, int(memory_budget // BYTES_PER_POINT[precision]))
+
+
+def chunk_slices(size, chunk_size):
+    for begin in range(0, size, chunk_size):
+        yield slice(begin, min(begin + chunk_size, size))
+
+
+def cell_columns(obj, prefix=''):
+    '''Flattened (name, value) pairs of all fields of a cell,
+    nested components are joined with dots, e.g. cathode.thickness'''
+    for f in fields(obj):
+        value = getattr(obj, f.name, None)
+        name = prefix + f.name
+        if is_dataclass(value):
+            yield from cell_columns(value, name + '.')
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                yield f'{name}.{k}', v
+        else:
+            yield name, value
+
+
+def cell_frame(cell, size, precision='float64', index=None):
+    '''
+    DataFrame of an evaluated cell with one row per design point.
+    Array valued fields give one value per row, scalars are repeated.
+    '''
+    dtype = PRECISIONS[precision]
+    columns = {}
+    for name, value in cell_columns(cell):
+        if isinstance(value, (int, float, np.number, np.ndarray)):
+            value = np.broadcast_to(value, size)
+            if np.issubdtype(value.dtype, np.floating):
+                value = value.astype(dtype)
+            else:
+                value = value.copy()
+        columns[name] = value
+    if index is None:
+        index = pd.RangeIndex(size)
+    return pd.DataFrame(columns, index=index)
+
+
+def precision_error(frame64, frame32, columns=None):
+    '''Largest relative error of float32 results against float64'''
+    columns = columns or [
+        'gravimetric_energy_density',
+        'volumetric_energy_density',
+        'capacity',
+        'energy',
+        'total_mass',
+    ]
+    reference = frame64[columns].to_numpy(dtype=np.float64)
+    approx = frame32[columns].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = np.abs(approx - reference) / np.abs(reference)
+    return pd.Series(np.nanmax(error, axis=0), index=columns)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+Persistent on-disk cache for cell evaluations and energy density sweeps.
+
+Results are stored in a SQLite file and keyed by a hash of the full cell
+input state plus the sweep definition. Entries are invalidated when the
+materials database or the model version changes and the least recently used
+entries are evicted once the cache grows over its size limit.
+'''
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+
+from cell_components import MODEL_VERSION, materials
+
+DEFAULT_CACHE_PATH = os.path.join('.wattcell_cache', 'results.sqlite')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+def cell_state(obj):
+    '''Canonical, JSON serialisable representation of the inputs of a cell.
+    Only fields set on construction are used, derived values are skipped.'''
+    if is_dataclass(obj):
+        return {
+            f.name: cell_state(getattr(obj, f.name))
+            for f in fields(obj)
+            if f.init
+        }
+    if isinstance(obj, dict):
+        return {str(k): cell_state(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [cell_state(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def hash_state(state):
+    text = json.dumps(state, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def model_fingerprint():
+    '''Changes whenever materials data or the model version change.'''
+    return hash_state({'materials': materials, 'model_version': MODEL_VERSION})
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = model_fingerprint()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )'''
+            )
+            # drop everything computed with other materials or model version
+            conn.execute(
+                'DELETE FROM results WHERE fingerprint != ?', (self.fingerprint,)
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def key(self, cell, **sweep):
+        return hash_state({
+            'cell': cell_state(cell),
+            'sweep': cell_state(sweep),
+            'fingerprint': self.fingerprint,
+        })
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM results WHERE key = ? AND fingerprint = ?',
+                (key, self.fingerprint),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key)
+            )
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, key, value):
+        blob = zlib.compress(pickle.dumps(value))
+        if len(blob) > self.max_bytes:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, self.fingerprint, blob, len(blob), time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # remove least recently used entries until the cache fits again
+        for key, size in conn.execute(
+            'SELECT key, size FROM results ORDER BY accessed'
+        ).fetchall():
+            conn.execute('DELETE FROM results WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM results')
@@ -8,10 +8,27 @@ This code defines classes of all battery components and the cell itself.
 It also has methods to perform all calculations
 '''
 
+import time
 import numpy as np
 from dataclasses import dataclass, field
 from typing import Dict, Any, Union
 from data import materials
+import metrics
+
+# bump whenever a change in the calculations alters the results
+MODEL_VERSION = '1.5'
+
+
+def spiral_length(diameter, stack_thickness):
+    '''
+    Length of an Archimedean spiral wound from the centre up to diameter,
+    growing by stack_thickness per turn. Works element-wise on numpy arrays.
+    '''
+    a = stack_thickness / (2 * np.pi)
+    theta = (diameter / 2) * (2 * np.pi) / stack_thickness
+    return (a / 2) * (
+        theta * (1 + theta**2) ** 0.5 + np.log(theta + (1 + theta**2) ** 0.5)
+    )
 
 
 @dataclass
@@ -147,6 +164,8 @@ class Cell:
     total_mass: float = field(init=False)
     total_volume: float = field(init=False)
     total_thickness: float = field(init=False)
+    mass_breakdown: Dict[str, float] = field(init=False)  # g per component
+    volume_breakdown: Dict[str, float] = field(init=False)  # cm3 per component
 
     def __post_init__(self):
         self.calculate_anode_properties()
@@ -175,6 +194,7 @@ class Cell:
         specific energy
         energy density
         '''
+        start = time.perf_counter()
         if isinstance(self.format, Pouch):
             self.calculate_pouch_energy()
         elif isinstance(self.format, Cylindrical):
@@ -195,6 +215,24 @@ class Cell:
         self.volumetric_energy_density = self.energy / self.total_volume * 1000  # Wh/L
         self.gravimetric_energy_density = self.energy / self.total_mass * 1000  # Wh/kg
 
+        if metrics.enabled():
+            metrics.observe_evaluation(
+                type(self.format).__name__,
+                np.broadcast(self.energy, self.total_mass, self.total_volume).size,
+                time.perf_counter() - start,
+            )
+
+    def set_breakdown(self, masses, volumes):
+        '''
+        Keeps the mass (g) and volume (cm3) of every component.
+        Electrolyte volume is only the excess outside the pores, volume of
+        the cell not taken by any component (e.g. headspace) is void.
+        '''
+        self.mass_breakdown = masses
+        self.volume_breakdown = dict(
+            volumes, void=self.total_volume - sum(volumes.values())
+        )
+
 
     def calculate_pouch_energy(self):
         # Calculate volumes of individual item (cm3)
@@ -301,6 +339,28 @@ class Cell:
             + self.anode.cc_thickness
             + 2 * self.separator.thickness
         ) * self.layers_number
+        self.set_breakdown(
+            {
+                'cathode': cathode_mass,
+                'cathode_cc': cathode_cc_mass,
+                'anode': anode_mass,
+                'anode_cc': anode_cc_mass,
+                'separator': separator_mass,
+                'electrolyte': electrolyte_mass,
+                'casing': pouch_mass,
+                'tabs': tabs_mass,
+                'extra': self.extra_mass,
+            },
+            {
+                'cathode': cathode_volume,
+                'cathode_cc': cathode_cc_volume,
+                'anode': anode_volume,
+                'anode_cc': anode_cc_volume,
+                'separator': separator_volume,
+                'electrolyte': self.electrolyte.volume - total_void_volume,
+                'casing': pouch_volume,
+            },
+        )
 
         # Calculate capacity (based on the limiting electrode)
         cathode_capacity = (
@@ -309,7 +369,7 @@ class Cell:
         anode_capacity = (
             anode_mass * self.anode.mass_ratio['am'] * self.anode.capacity / 1000
         )  # Convert to Ah
-        self.capacity = min(cathode_capacity, anode_capacity) * self.ice
+        self.capacity = np.minimum(cathode_capacity, anode_capacity) * self.ice
 
 
     def calculate_cylindrical_energy(self):
@@ -324,18 +384,8 @@ class Cell:
 
         # Calculate jelly roll length
         d_cell = self.format.diameter - 2 * self.format.can_thickness
-
-        a = stack_thickness / (2 * np.pi)
-        theta = (d_cell / 2) * (2 * np.pi) / stack_thickness
-        total_length = (a / 2) * (
-            theta * (1 + theta**2) ** 0.5 + np.log(theta + (1 + theta**2) ** 0.5)
-        )
-
-        theta_mandrel = (self.format.mandrel_diam / 2) * (2 * np.pi) / stack_thickness
-        length_inner_void = (a / 2) * (
-            theta_mandrel * (1 + theta_mandrel**2) ** 0.5
-            + np.log(theta_mandrel + (1 + theta_mandrel**2) ** 0.5)
-        )
+        total_length = spiral_length(d_cell, stack_thickness)
+        length_inner_void = spiral_length(self.format.mandrel_diam, stack_thickness)
 
         length_jellyroll = total_length - length_inner_void
 
@@ -404,6 +454,28 @@ class Cell:
             + self.extra_mass
         )
         self.total_volume = np.pi * (self.format.diameter / 2) ** 2 * self.format.height
+        self.set_breakdown(
+            {
+                'cathode': cathode_mass,
+                'cathode_cc': cathode_cc_mass,
+                'anode': anode_mass,
+                'anode_cc': anode_cc_mass,
+                'separator': separator_mass,
+                'electrolyte': electrolyte_mass,
+                'casing': can_mass,
+                'tabs': 0,
+                'extra': self.extra_mass,
+            },
+            {
+                'cathode': cathode_volume,
+                'cathode_cc': cathode_cc_volume,
+                'anode': anode_volume,
+                'anode_cc': anode_cc_volume,
+                'separator': separator_volume,
+                'electrolyte': self.electrolyte.volume - total_void_volume,
+                'casing': can_volume,
+            },
+        )
 
         # Calculate capacity
         cathode_capacity = (
@@ -412,7 +484,7 @@ class Cell:
         anode_capacity = (
             anode_mass * self.anode.mass_ratio["am"] * self.anode.capacity / 1000
         )
-        self.capacity = min(cathode_capacity, anode_capacity) * self.ice
+        self.capacity = np.minimum(cathode_capacity, anode_capacity) * self.ice
 
 
     def calculate_prismatic_energy(self):
@@ -427,31 +499,28 @@ class Cell:
 
         # only matters for wound
         # Calculate jelly roll dimensions
-        d = min(self.format.width, self.format.depth)
+        d = np.minimum(self.format.width, self.format.depth)
         d_jellyroll = d - 2 * self.format.can_thickness - 2 * self.separator.thickness 
 
         # Calculate number of turns
-        a = stack_thickness / (2 * np.pi)
-        theta = (d_jellyroll / 2) * (2 * np.pi) / stack_thickness
-        length_jellyroll = (a / 2) * (
-            theta * (1 + theta**2) ** 0.5 + np.log(theta + (1 + theta**2) ** 0.5)
-        )
+        length_jellyroll = spiral_length(d_jellyroll, stack_thickness)
 
-        # Calculate number of layers
+        # Calculate number of layers (only whole layers fit in the can)
         available_depth = self.format.depth - 2 * self.format.can_thickness - 4 * self.separator.thickness - self.anode.thickness - self.anode.cc_thickness
-        self.layers_number = int(available_depth / stack_thickness)
+        stacked_layers = np.trunc(available_depth / stack_thickness).astype(int)
 
         # Calculate electrode and separator dimensions
         if self.format.structure == 'Wound':
             flat_width = self.format.width - d_jellyroll - 2 * self.format.can_thickness
-            self.separator.width = length_jellyroll + (self.layers_number + 1) * flat_width
-            self.cathode.width = length_jellyroll + self.layers_number * flat_width - 2 * d_jellyroll * np.pi   # 2 turns less than separator
-            self.anode.width = length_jellyroll + (self.layers_number + 1) * flat_width - d_jellyroll * np.pi  # 1 turn less than separator
-            self.layers_number = 1  # reset layers nr
+            self.separator.width = length_jellyroll + (stacked_layers + 1) * flat_width
+            self.cathode.width = length_jellyroll + stacked_layers * flat_width - 2 * d_jellyroll * np.pi   # 2 turns less than separator
+            self.anode.width = length_jellyroll + (stacked_layers + 1) * flat_width - d_jellyroll * np.pi  # 1 turn less than separator
+            layers_number = 1  # single jelly roll
         else:
             self.cathode.width = self.format.width - 2 * self.format.can_thickness - 0.4
             self.anode.width = self.cathode.width + 0.2
             self.separator.width = self.cathode.width + 0.4
+            layers_number = stacked_layers
 
         self.cathode.height = self.format.height - 2 * self.format.can_thickness - self.format.headspace - 0.4
         self.anode.height = self.format.height - 2 * self.format.can_thickness - self.format.headspace - 0.2
@@ -463,7 +532,7 @@ class Cell:
             * self.cathode.height
             * self.cathode.thickness
             * 2
-            * self.layers_number
+            * layers_number
         )
         if self.format.structure == 'Wound':
             anode_volume = (
@@ -478,14 +547,14 @@ class Cell:
                 * self.anode.height
                 * self.anode.thickness
                 * 2
-                * (self.layers_number + 1)  # Extra anode layer
+                * (layers_number + 1)  # Extra anode layer
             )
         separator_volume = (
             self.separator.width
             * self.separator.height
             * self.separator.thickness
             * 2
-            * self.layers_number
+            * layers_number
         )
         can_volume = (
             self.format.width * self.format.height * self.format.depth
@@ -501,12 +570,12 @@ class Cell:
             )
         else:
             anode_cc_volume = (
-                (self.layers_number + 1)  # Extra anode current collector
+                (layers_number + 1)  # Extra anode current collector
                 * (self.anode.width * self.anode.height)
                 * self.anode.cc_thickness
             )
         cathode_cc_volume = (
-            self.layers_number
+            layers_number
             * (self.cathode.width * self.cathode.height)
             * self.cathode.cc_thickness
         )
@@ -558,6 +627,29 @@ class Cell:
             + self.extra_mass
         )
         self.total_volume = self.format.width * self.format.height * self.format.depth
+        self.layers_number = layers_number
+        self.set_breakdown(
+            {
+                'cathode': cathode_mass,
+                'cathode_cc': cathode_cc_mass,
+                'anode': anode_mass,
+                'anode_cc': anode_cc_mass,
+                'separator': separator_mass,
+                'electrolyte': electrolyte_mass,
+                'casing': can_mass,
+                'tabs': tabs_mass,
+                'extra': self.extra_mass,
+            },
+            {
+                'cathode': cathode_volume,
+                'cathode_cc': cathode_cc_volume,
+                'anode': anode_volume,
+                'anode_cc': anode_cc_volume,
+                'separator': separator_volume,
+                'electrolyte': self.electrolyte.volume - total_void_volume,
+                'casing': can_volume,
+            },
+        )
 
         # Calculate capacity (based on the limiting electrode)
         cathode_capacity = (
@@ -566,7 +658,7 @@ class Cell:
         anode_capacity = (
             anode_mass * self.anode.mass_ratio['am'] * self.anode.capacity / 1000
         )  # Convert to Ah
-        self.capacity = min(cathode_capacity, anode_capacity) * self.ice
+        self.capacity = np.minimum(cathode_capacity, anode_capacity) * self.ice
 
 
     def anode_free_energy(self):
@@ -603,4 +695,5 @@ class Cell:
 
         anode_mass = anode_volume * self.anode.density
         self.total_mass = self.total_mass - anode_mass
+        self.mass_breakdown['anode'] = self.mass_breakdown['anode'] - anode_mass
         self.gravimetric_energy_density = self.energy / self.total_mass * 1000  # Wh/kg
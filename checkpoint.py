@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+'''
+Checkpointed energy density sweeps.
+
+Every finished chunk of a sweep is written to its own file in the checkpoint
+directory and recorded in manifest.json. Running the same sweep again with
+the same directory skips the recorded index ranges and evaluates only the
+missing ones, so a pre-empted run resumes where it stopped. The combined
+result is identical to an uninterrupted run.
+'''
+
+import json
+import os
+
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, chunk_size_for_budget
+from cache import cell_state, hash_state, model_fingerprint
+from graphs import evaluate_chunk
+
+MANIFEST = 'manifest.json'
+
+
+def sweep_id(cell, parameter, start, end, steps, anodefree, precision):
+    return hash_state({
+        'cell': cell_state(cell),
+        'sweep': cell_state(dict(
+            parameter=parameter, start=start, end=end, steps=steps,
+            anodefree=anodefree, precision=precision
+        )),
+        'fingerprint': model_fingerprint(),
+    })
+
+
+def write_atomic(path, write):
+    '''Writes to a temporary file first, so an interrupted write
+    never leaves a half written file behind'''
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def chunk_path(directory, begin, stop):
+    return os.path.join(directory, f'chunk_{begin:012d}_{stop:012d}.pkl')
+
+
+def load_manifest(directory, sweep, steps, chunk_size):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {'sweep': sweep, 'steps': steps, 'chunk_size': chunk_size, 'done': []}
+    with open(path) as file:
+        manifest = json.load(file)
+    if manifest['sweep'] != sweep:
+        raise ValueError(
+            f'Checkpoint directory {directory} belongs to a different sweep'
+        )
+    return manifest
+
+
+def save_manifest(directory, manifest):
+    def write(path):
+        with open(path, 'w') as file:
+            json.dump(manifest, file, indent=1)
+    write_atomic(os.path.join(directory, MANIFEST), write)
+
+
+def missing_ranges(done, steps, chunk_size):
+    '''Chunks of range(steps) not covered by the done [begin, stop) ranges'''
+    missing = []
+    position = 0
+    for begin, stop in sorted(done) + [[steps, steps]]:
+        for gap_begin in range(position, begin, chunk_size):
+            missing.append(slice(gap_begin, min(gap_begin + chunk_size, begin)))
+        position = max(position, stop)
+    return missing
+
+
+def checkpointed_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, directory,
+    chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET, precision='float64'
+):
+    '''
+    Same results as generate_energy_density_data, but every chunk is
+    persisted in directory as soon as it is finished. Calling it again
+    after an interruption evaluates only the chunks that are missing.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    if chunk_size is None:
+        chunk_size = chunk_size_for_budget(memory_budget, precision)
+
+    sweep = sweep_id(cell, parameter, start, end, steps, anodefree, precision)
+    manifest = load_manifest(directory, sweep, steps, chunk_size)
+
+    for chunk in missing_ranges(manifest['done'], steps, manifest['chunk_size']):
+        df = evaluate_chunk(
+            cell, parameter, start, end, steps, anodefree, chunk, precision
+        )
+        write_atomic(chunk_path(directory, chunk.start, chunk.stop), df.to_pickle)
+        # only recorded as done once the chunk file is complete
+        manifest['done'].append([chunk.start, chunk.stop])
+        save_manifest(directory, manifest)
+
+    return load_checkpointed_data(directory)
+
+
+def load_checkpointed_data(directory):
+    '''Combines all finished chunks of a checkpoint directory in order'''
+    with open(os.path.join(directory, MANIFEST)) as file:
+        manifest = json.load(file)
+    chunks = [
+        pd.read_pickle(chunk_path(directory, begin, stop))
+        for begin, stop in sorted(manifest['done'])
+    ]
+    return pd.concat(chunks, ignore_index=True)
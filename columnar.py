@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+'''
+Memory-mapped column storage for very large sweep results.
+
+A result set is a directory with one raw binary file per column and a
+schema.json with the dtype of every column and the number of rows. Text
+columns are stored as integer codes with their categories in the schema,
+columns without any values (e.g. total_thickness of cylindrical cells) as
+NaN. Writing appends chunk by chunk, so results never have to be in memory
+at once, and the schema is written last.
+
+ColumnStore opens a result set read-only with np.memmap. Nothing is read
+until a column is sliced, filtered or downsampled, and the operating system
+shares the pages of the files between every process and session that opens
+the same result set.
+'''
+
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, chunk_size_for_budget
+from checkpoint import write_atomic
+from graphs import iter_energy_density_data
+
+SCHEMA = 'schema.json'
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+# rows read at once when scanning a column
+SCAN_ROWS = 1_000_000
+
+
+def column_file(directory, index):
+    return os.path.join(directory, f'column_{index:05d}.bin')
+
+
+def column_dtype(series):
+    '''Storage dtype and whether the column is stored as text codes'''
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+        return series.dtype.str, False
+    if series.isna().all():
+        return np.dtype(np.float64).str, False
+    return np.dtype(np.int32).str, True
+
+
+def write_columns(chunks, directory):
+    '''
+    Writes a DataFrame or an iterable of DataFrame chunks with the same
+    columns to directory. Returns the number of rows written.
+    '''
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, SCHEMA)):
+        os.remove(os.path.join(directory, SCHEMA))
+
+    columns = None
+    files = []
+    rows = 0
+    try:
+        for df in chunks:
+            if columns is None:
+                columns = []
+                for i, name in enumerate(df.columns):
+                    dtype, text = column_dtype(df[name])
+                    columns.append({
+                        'name': name, 'dtype': dtype,
+                        'categories': [] if text else None,
+                    })
+                    files.append(open(column_file(directory, i), 'wb'))
+            for column, file in zip(columns, files):
+                values = df[column['name']]
+                if column['categories'] is not None:
+                    values = encode(values, column['categories'])
+                else:
+                    values = pd.to_numeric(values, errors='coerce') if values.dtype == object else values
+                    values = values.to_numpy().astype(column['dtype'], copy=False)
+                file.write(values.tobytes())
+            rows += len(df)
+    finally:
+        for file in files:
+            file.close()
+
+    schema = {'rows': rows, 'columns': columns or []}
+
+    def write(path):
+        with open(path, 'w') as file:
+            json.dump(schema, file, indent=1)
+    write_atomic(os.path.join(directory, SCHEMA), write)
+    return rows
+
+
+def encode(values, categories):
+    '''Integer codes of text values, new values are added to categories.
+    Missing values get -1.'''
+    codes = {c: i for i, c in enumerate(categories)}
+    for value in values.dropna().unique():
+        if value not in codes:
+            codes[value] = len(categories)
+            categories.append(value)
+    return values.map(codes).fillna(-1).to_numpy(dtype=np.int32)
+
+
+def write_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, directory,
+    memory_budget=DEFAULT_MEMORY_BUDGET, precision='float64'
+):
+    '''Streams a sweep chunk by chunk into a memory-mapped result set'''
+    chunks = iter_energy_density_data(
+        cell, parameter, start, end, steps, anodefree,
+        chunk_size=chunk_size_for_budget(memory_budget, precision),
+        precision=precision
+    )
+    write_columns(chunks, directory)
+    return ColumnStore(directory)
+
+
+class ColumnStore:
+    '''Read-only, lazily loaded view of a result set'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        path = os.path.join(directory, SCHEMA)
+        if not os.path.exists(path):
+            raise ValueError(f'No complete result set in {directory}')
+        with open(path) as file:
+            schema = json.load(file)
+        self.rows = schema['rows']
+        self.schema = {c['name']: (i, c) for i, c in enumerate(schema['columns'])}
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        '''Memory-mapped raw values of a column, nothing is read yet'''
+        if name not in self.schema:
+            raise KeyError(f'Unknown column: {name}')
+        if name not in self._columns:
+            index, column = self.schema[name]
+            if self.rows == 0:
+                self._columns[name] = np.empty(0, dtype=column['dtype'])
+            else:
+                self._columns[name] = np.memmap(
+                    column_file(self.directory, index), dtype=column['dtype'],
+                    mode='r', shape=(self.rows,)
+                )
+        return self._columns[name]
+
+    def _decode(self, name, values):
+        categories = self.schema[name][1]['categories']
+        if categories is None:
+            return np.asarray(values)
+        labels = np.array(categories + [None], dtype=object)
+        return labels[values]
+
+    def take(self, rows, columns=None):
+        '''DataFrame of the given rows (slice or indices), reading only them'''
+        columns = columns or self.columns
+        index = pd.RangeIndex(self.rows)[rows]
+        return pd.DataFrame(
+            {name: self._decode(name, self.column(name)[rows]) for name in columns},
+            index=index,
+        )
+
+    def slice(self, start=None, stop=None, step=None, columns=None):
+        return self.take(slice(start, stop, step), columns)
+
+    def head(self, n=5, columns=None):
+        return self.slice(0, n, columns=columns)
+
+    def to_frame(self, columns=None):
+        '''Loads the whole result set, only for result sets that fit in memory'''
+        return self.slice(columns=columns)
+
+    def mask(self, where):
+        '''Boolean mask of rows matching all (column, operator, value) filters,
+        scanned in blocks so only a block of every column is in memory'''
+        result = np.ones(self.rows, dtype=bool)
+        for column, op, value in where:
+            if op not in OPERATORS:
+                raise ValueError(f'Unknown operator: {op}')
+            categories = self.schema[column][1]['categories'] if column in self.schema else None
+            if categories is not None:
+                # compare the codes of text columns
+                value = categories.index(value) if value in categories else -2
+            values = self.column(column)
+            for begin in range(0, self.rows, SCAN_ROWS):
+                block = slice(begin, begin + SCAN_ROWS)
+                result[block] &= OPERATORS[op](values[block], value)
+        return result
+
+    def filter(self, where, columns=None):
+        '''Rows matching all filters, e.g. where=[('feasible', '=', True)]'''
+        return self.take(np.flatnonzero(self.mask(where)), columns)
+
+    def downsample(self, x, y, max_points=2000, columns=None):
+        '''
+        At most about max_points rows for plotting y against x. The rows are
+        split into buckets and the minimum and maximum of every y column are
+        kept from each, so peaks and steps survive the reduction.
+        '''
+        y = [y] if isinstance(y, str) else list(y)
+        columns = list(dict.fromkeys([x] + y + list(columns or [])))
+        buckets = max(1, max_points // (2 * len(y)))
+        if self.rows <= max_points:
+            return self.slice(columns=columns)
+
+        bounds = np.linspace(0, self.rows, buckets + 1).astype(int)
+        selected = []
+        for begin, stop in zip(bounds[:-1], bounds[1:]):
+            selected.append([begin])
+            for name in y:
+                values = np.asarray(self.column(name)[begin:stop], dtype=float)
+                if np.isnan(values).all():
+                    continue
+                selected.append([begin + np.nanargmin(values), begin + np.nanargmax(values)])
+        rows = np.unique(np.concatenate(selected))
+        return self.take(rows, columns)
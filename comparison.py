@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+'''
+Cross-format comparison of one cell chemistry.
+
+The electrodes, separator and electrolyte of a design are evaluated as a
+pouch cell, in every cylindrical size of data.materials (18650, 21700,
+4680) and as wound and Z-stacked prismatic cells. The format independent
+electrode work (composite densities, areal capacities and the anode
+thickness) is done once and shared by all formats, all cylindrical sizes
+are evaluated together in one vectorised pass.
+
+Formats other than the one of the design take their dimensions from the
+default design of the app, e.g. the pouch of a cylindrical design has the
+electrode area and the layers of the default pouch. Cylindrical cans keep
+the can material of a cylindrical design and are stainless steel otherwise.
+'''
+
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from accessor import STRUCTURES, default_cell
+from batch import cell_frame
+from cell_components import Cylindrical, Pouch, Prismatic, Tab, materials
+from dataset import OUTPUTS
+from validation import validate_cell
+from variants import evaluate_electrodes, get_field, variant_cell
+
+# inputs of a pouch cell the other formats derive from their dimensions
+POUCH_FIELDS = [
+    'cathode.width',
+    'cathode.height',
+    'anode.width',
+    'anode.height',
+    'separator.width',
+    'separator.height',
+    'format',
+    'tabs',
+    'layers_number',
+]
+
+COLUMNS = OUTPUTS + ['layers_number']
+
+
+def cylindrical_presets(can_density=None):
+    '''Names of the cylindrical sizes and one Cylindrical holding all of them'''
+    presets = materials['formats']['cylindrical']
+    if can_density is None:
+        can_density = materials['can_density']['Stainless steel']
+
+    def sizes(key):
+        return np.array([size[key] for size in presets.values()], dtype=float) / 10
+
+    return list(presets), Cylindrical(
+        diameter=sizes('diameter'),
+        height=sizes('height'),
+        can_thickness=sizes('can_thickness'),
+        can_density=can_density,
+        mandrel_diam=sizes('mandrel_dia'),
+        headspace=sizes('headspace'),
+    )
+
+
+def format_designs(cell):
+    '''(names, overrides) turning the design into each compared format,
+    array valued overrides give one design per name'''
+    pouch = cell if isinstance(cell.format, Pouch) else default_cell('pouch')
+    designs = [(['Pouch'], {name: get_field(pouch, name) for name in POUCH_FIELDS})]
+
+    can_density = cell.format.can_density if isinstance(cell.format, Cylindrical) else None
+    names, cylinder = cylindrical_presets(can_density)
+    designs.append((names, {'format': cylinder, 'tabs': Tab(), 'layers_number': None}))
+
+    prismatic = cell if isinstance(cell.format, Prismatic) else default_cell('prismatic')
+    for structure in STRUCTURES:
+        designs.append((
+            [f'Prismatic {structure}'],
+            {'format': replace(prismatic.format, structure=structure), 'tabs': prismatic.tabs},
+        ))
+    return designs
+
+
+def compare_formats(cell, anodefree=False):
+    '''
+    Evaluates the chemistry of the cell in every format. Returns a table
+    with one row per format: the metrics, the mass (g) and volume (cm3)
+    breakdowns as mass_breakdown.<component> and volume_breakdown.<component>
+    columns and whether the design is feasible.
+    '''
+    shared = variant_cell(cell, {})
+    evaluate_electrodes(shared)
+
+    frames = []
+    for names, overrides in format_designs(cell):
+        evaluated = variant_cell(shared, overrides)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            evaluated.calculate_energy_density()
+            if anodefree:
+                evaluated.anode_free_energy()
+            report = validate_cell(evaluated, len(names))
+        frame = cell_frame(evaluated, len(names), index=pd.Index(names, name='format'))
+        breakdowns = [c for c in frame if c.split('.')[0] in ['mass_breakdown', 'volume_breakdown']]
+        frame = frame[COLUMNS + breakdowns].copy()
+        frame['feasible'] = report['feasible'].to_numpy()
+        frames.append(frame)
+
+    table = pd.concat(frames)
+    table['layers_number'] = pd.to_numeric(table['layers_number'])
+    # components a format doesn't have, e.g. the tabs of cylindrical cells
+    breakdowns = [c for c in table if c.split('.')[0] in ['mass_breakdown', 'volume_breakdown']]
+    table[breakdowns] = table[breakdowns].fillna(0)
+    return table
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+Cycle life projection of energy for batches of designs.
+
+A fade model per design gives the fraction of capacity lost and the drop of
+the average voltage (no resistance, so no rate dependence) after a reference
+number of cycles. Both follow the same law of the cycle number N:
+
+    linear: f(N) = N / N_ref
+    sqrt:   f(N) = (N / N_ref) ** 0.5
+
+    capacity(N) = capacity * (1 - capacity_fade * f(N))
+    voltage(N) = voltage - voltage_sag * f(N)
+
+All designs and cycles are projected at once as design x cycle arrays, so
+the lifetime energy throughput of hundreds of designs is compared in one
+pass. Inputs are the beginning of life capacity, energy and mass of a
+results DataFrame (one row per design) or of an evaluated cell.
+'''
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+FADE_MODELS = ['linear', 'sqrt']
+
+
+@dataclass
+class Projection:
+    '''Projected values with one row per design and one column per cycle'''
+    cycles: np.ndarray
+    capacity: np.ndarray  # Ah
+    energy: np.ndarray  # Wh
+    gravimetric_energy_density: np.ndarray  # Wh/kg
+    retention: np.ndarray  # fraction of the initial capacity
+
+    def lifetime(self, end_of_life=0.8):
+        '''
+        Cycles until the capacity retention drops below end_of_life and
+        the energy delivered until then (Wh), per design.
+        Designs that never reach it within the projected cycles get the
+        last projected cycle.
+        '''
+        alive = self.retention >= end_of_life
+        cycles = np.broadcast_to(self.cycles, alive.shape)
+        cycle_life = np.where(alive, cycles, 0).max(axis=1)
+        # energy delivered in every interval between projected cycles
+        intervals = np.diff(self.cycles, prepend=0)
+        throughput = np.where(alive, self.energy * intervals, 0).sum(axis=1)
+        return pd.DataFrame({
+            'cycle_life': cycle_life,
+            'lifetime_energy': throughput,
+        })
+
+    def to_frame(self):
+        '''Long format DataFrame with one row per design and cycle'''
+        designs, cycles = np.indices(self.energy.shape)
+        return pd.DataFrame({
+            'design': designs.ravel(),
+            'cycle': self.cycles[cycles.ravel()],
+            'capacity': self.capacity.ravel(),
+            'energy': self.energy.ravel(),
+            'gravimetric_energy_density': self.gravimetric_energy_density.ravel(),
+            'retention': self.retention.ravel(),
+        })
+
+
+def fade_fraction(cycles, reference_cycles, model):
+    '''f(N) of every design (rows) and cycle (columns)'''
+    ratio = cycles[None, :] / np.asarray(reference_cycles, dtype=float)[..., None]
+    model = np.asarray(model)[..., None]
+    return np.where(model == 'linear', ratio, np.sqrt(ratio))
+
+
+def project(
+    capacity, energy, total_mass, cycles, capacity_fade=0.2, voltage_sag=0.0,
+    model='sqrt', reference_cycles=1000
+):
+    '''
+    Projects capacity, energy and specific energy of every design over the
+    cycles. capacity (Ah), energy (Wh) and total_mass (g) hold one value per
+    design. capacity_fade (fraction), voltage_sag (V), model and
+    reference_cycles may be one value for all designs or one per design.
+    '''
+    capacity = np.atleast_1d(np.asarray(capacity, dtype=float))
+    energy = np.atleast_1d(np.asarray(energy, dtype=float))
+    total_mass = np.atleast_1d(np.asarray(total_mass, dtype=float))
+    cycles = np.asarray(cycles, dtype=float)
+    size = np.broadcast_shapes(capacity.shape, energy.shape, total_mass.shape)
+
+    model = np.broadcast_to(model, size)
+    unknown = set(np.unique(model)) - set(FADE_MODELS)
+    if unknown:
+        raise ValueError(f'Unknown fade model: {", ".join(sorted(unknown))}')
+
+    fade = fade_fraction(cycles, np.broadcast_to(reference_cycles, size), model)
+    capacity_fade = np.broadcast_to(capacity_fade, size)[:, None]
+    voltage_sag = np.broadcast_to(voltage_sag, size)[:, None]
+
+    # capacity can't fade below zero
+    retention = np.clip(1 - capacity_fade * fade, 0, None)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        voltage = (energy / capacity)[:, None]
+        projected_voltage = np.clip(voltage - voltage_sag * fade, 0, None)
+        projected_capacity = capacity[:, None] * retention
+        projected_energy = projected_capacity * projected_voltage
+        gravimetric = projected_energy / total_mass[:, None] * 1000
+
+    return Projection(
+        cycles=cycles,
+        capacity=projected_capacity,
+        energy=projected_energy,
+        gravimetric_energy_density=gravimetric,
+        retention=retention,
+    )
+
+
+def project_designs(df, cycles, **fade):
+    '''Projection of every row of a results DataFrame,
+    keyword arguments as in project'''
+    return project(df['capacity'], df['energy'], df['total_mass'], cycles, **fade)
+
+
+def project_cell(cell, cycles, **fade):
+    '''Projection of an evaluated cell, one design per element of array inputs'''
+    return project(cell.capacity, cell.energy, cell.total_mass, cycles, **fade)
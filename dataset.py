@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+'''
+Space-filling synthetic datasets of the cell model, e.g. to train ML
+surrogates.
+
+Inputs are sampled over ranges of any numeric field of the cell (dotted
+names as in the results, in the units of the model, e.g.
+cathode.thickness in cm) and over material choices from data.materials:
+
+    ranges = {
+        'cathode.thickness': (40e-4, 150e-4),
+        'cathode.porosity': (0.15, 0.4),
+        'layers_number': (10, 60),
+        'cathode.active_material': ['NMC811', 'LFP', 'NCA'],
+        'separator.material': 'all',
+    }
+
+A material choice sets the properties of the material from the database,
+a range given for one of those fields too replaces them. All other inputs
+keep the values of the base cell. Samples are Latin hypercubes (one per
+shard) or, with scipy installed, one scrambled Sobol sequence.
+
+Samples are evaluated in vectorised batches and written to shards of
+compressed columns (npz) with a manifest.json holding the schema, the
+input ranges and the list of shards. Materials are stored as integer codes
+into the categories of the manifest. Each shard is written atomically and
+the manifest is updated after it, so a dataset is usable while it grows.
+'''
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, PRECISIONS, chunk_size_for_budget, chunk_slices
+from cache import cell_state, model_fingerprint
+from cell_components import materials
+from checkpoint import write_atomic
+from sensitivity import numeric_inputs
+from validation import validate_cell
+from variants import evaluate_variant, get_field
+
+try:
+    from scipy.stats import qmc
+except ImportError:  # Sobol sequences need scipy
+    qmc = None
+
+MANIFEST = 'manifest.json'
+METHODS = ['lhs', 'sobol']
+
+OUTPUTS = [
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+    'capacity',
+    'energy',
+    'total_mass',
+    'total_volume',
+]
+
+INTEGER_FIELDS = ['layers_number']
+
+# material field: (materials table, {property: (field it sets, scale)}, by name)
+# by name: the model looks the material up by its name, so designs with
+# different choices are evaluated separately
+MATERIAL_FIELDS = {
+    'cathode.active_material': ('cathodes', {
+        'density': ('cathode.density_am', 1),
+        'capacity': ('cathode.capacity', 1),
+        'voltage': ('cathode.voltage', 1),
+    }, False),
+    'anode.active_material': ('anodes', {
+        'density': ('anode.density_am', 1),
+        'capacity': ('anode.capacity', 1),
+        'voltage': ('anode.voltage', 1),
+    }, False),
+    'cathode.binder': ('binders', {}, True),
+    'anode.binder': ('binders', {}, True),
+    'cathode.current_collector': ('current_collectors', {
+        'thickness': ('cathode.cc_thickness', 1e-4),
+    }, True),
+    'anode.current_collector': ('current_collectors', {
+        'thickness': ('anode.cc_thickness', 1e-4),
+    }, True),
+    'separator.material': ('separators', {
+        'thickness': ('separator.thickness', 1e-4),
+        'porosity': ('separator.porosity', 1),
+        'density': ('separator.density', 1),
+    }, False),
+    'electrolyte.material': ('electrolytes', {
+        'density': ('electrolyte.density', 1),
+    }, False),
+    'tabs.material_cathode': ('tabs', {}, True),
+    'tabs.material_anode': ('tabs', {}, True),
+}
+
+
+def parse_ranges(cell, ranges):
+    '''Checks the ranges against the fields of the cell,
+    returns {name: spec} with numeric (low, high) or categories'''
+    numeric = {name for name, _, _ in numeric_inputs(cell)}
+    inputs = {}
+    for name, choice in ranges.items():
+        if name in MATERIAL_FIELDS:
+            table = materials[MATERIAL_FIELDS[name][0]]
+            categories = list(table) if choice == 'all' else list(choice)
+            unknown = [c for c in categories if c not in table]
+            if unknown or not categories:
+                raise ValueError(f'Unknown materials for {name}: {", ".join(map(str, unknown))}')
+            inputs[name] = {'kind': 'categorical', 'categories': categories}
+        elif name in numeric:
+            low, high = choice
+            if not low <= high:
+                raise ValueError(f'Empty range for {name}: {low} - {high}')
+            inputs[name] = {'kind': 'numeric', 'low': low, 'high': high}
+        else:
+            raise ValueError(f'Unknown input: {name}')
+    return inputs
+
+
+def latin_hypercube(size, dimensions, rng):
+    '''size points in [0, 1)^dimensions with exactly one point in each of
+    the size equal strata of every dimension'''
+    strata = np.argsort(rng.random((dimensions, size)), axis=1)
+    return ((strata + rng.random((dimensions, size))) / size).T
+
+
+def scale_samples(unit, inputs):
+    '''Input values of samples in the unit hypercube,
+    materials as integer codes into their categories'''
+    values = {}
+    for u, (name, spec) in zip(unit.T, inputs.items()):
+        if spec['kind'] == 'categorical':
+            n = len(spec['categories'])
+            values[name] = np.minimum(u * n, n - 1).astype(np.int32)
+        elif name in INTEGER_FIELDS:
+            low, high = int(spec['low']), int(spec['high'])
+            values[name] = np.minimum(low + np.floor(u * (high - low + 1)), high).astype(int)
+        else:
+            values[name] = spec['low'] + u * (spec['high'] - spec['low'])
+    return values
+
+
+def evaluate_group(cell, values, inputs, rows, anodefree, outputs=OUTPUTS):
+    '''Evaluates the rows of the samples, which share all materials
+    looked up by name, in one vectorised pass'''
+    overrides = {}
+    for name, spec in inputs.items():
+        if spec['kind'] != 'categorical':
+            continue
+        table, properties, by_name = MATERIAL_FIELDS[name]
+        codes = values[name][rows]
+        if by_name:
+            overrides[name] = spec['categories'][codes[0]]
+        for prop, (field_name, scale) in properties.items():
+            if field_name not in inputs:
+                lookup = np.array([
+                    materials[table][c][prop] * scale for c in spec['categories']
+                ])
+                overrides[field_name] = lookup[codes]
+    for name, spec in inputs.items():
+        if spec['kind'] == 'numeric':
+            overrides[name] = values[name][rows]
+
+    evaluated = evaluate_variant(cell, overrides, anodefree)
+    # invalid designs give inf or nan, flagged by the feasible column
+    with np.errstate(invalid='ignore'):
+        feasible = validate_cell(evaluated, len(rows))['feasible'].to_numpy()
+    results = {m: np.broadcast_to(get_field(evaluated, m), len(rows)) for m in outputs}
+    results['feasible'] = feasible
+    return results
+
+
+def evaluate_samples(cell, values, inputs, anodefree=False, outputs=OUTPUTS, size=None):
+    '''Outputs (dotted names) and feasibility of every sample'''
+    if size is None:
+        size = len(next(iter(values.values())))
+    results = {m: np.empty(size) for m in outputs}
+    results['feasible'] = np.empty(size, dtype=bool)
+
+    by_name = [
+        name for name, spec in inputs.items()
+        if spec['kind'] == 'categorical' and MATERIAL_FIELDS[name][2]
+    ]
+    if by_name:
+        _, groups = np.unique(
+            np.column_stack([values[name] for name in by_name]), axis=0, return_inverse=True
+        )
+        groups = groups.ravel()
+    else:
+        groups = np.zeros(size, dtype=int)
+    order = np.argsort(groups, kind='stable')
+    bounds = np.cumsum(np.bincount(groups))
+    for rows in np.split(order, bounds[:-1]):
+        evaluated = evaluate_group(cell, values, inputs, rows, anodefree, outputs)
+        for name, value in evaluated.items():
+            results[name][rows] = value
+    return results
+
+
+def shard_file(index):
+    return f'shard_{index:05d}.npz'
+
+
+def write_shard(directory, index, columns):
+    def write(path):
+        with open(path, 'wb') as file:
+            np.savez_compressed(file, **columns)
+    write_atomic(os.path.join(directory, shard_file(index)), write)
+
+
+def write_manifest(directory, manifest):
+    def write(path):
+        with open(path, 'w') as file:
+            json.dump(manifest, file, indent=1, default=str)
+    write_atomic(os.path.join(directory, MANIFEST), write)
+
+
+def generate_dataset(
+    cell, ranges, directory, rows, method='lhs', shard_rows=500_000,
+    anodefree=False, seed=0, memory_budget=DEFAULT_MEMORY_BUDGET, precision='float64'
+):
+    '''
+    Samples rows designs over the ranges (see the module docstring),
+    evaluates them and writes the inputs, the metrics and a feasible column
+    to shards of at most shard_rows rows in directory.
+    Returns the manifest.
+    '''
+    if method not in METHODS:
+        raise ValueError(f'Unknown sampling method: {method}')
+    if method == 'sobol' and qmc is None:
+        raise ValueError('Sobol sampling needs scipy, use lhs instead')
+    inputs = parse_ranges(cell, ranges)
+    dtype = PRECISIONS[precision]
+    os.makedirs(directory, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    sobol = qmc.Sobol(len(inputs), scramble=True, seed=seed) if method == 'sobol' else None
+    chunk_size = chunk_size_for_budget(memory_budget, precision)
+
+    manifest = {
+        'method': method,
+        'seed': seed,
+        'anodefree': anodefree,
+        'fingerprint': model_fingerprint(),
+        'base_cell': cell_state(cell),
+        'inputs': inputs,
+        'columns': None,
+        'rows': 0,
+        'shards': [],
+        'complete': False,
+    }
+    for index, shard in enumerate(chunk_slices(rows, shard_rows)):
+        size = shard.stop - shard.start
+        if sobol is not None:
+            unit = sobol.random(size)
+        else:
+            unit = latin_hypercube(size, len(inputs), rng)
+        values = scale_samples(unit, inputs)
+
+        results = {m: np.empty(size, dtype=dtype) for m in OUTPUTS}
+        results['feasible'] = np.empty(size, dtype=bool)
+        for chunk in chunk_slices(size, chunk_size):
+            evaluated = evaluate_samples(
+                cell, {name: v[chunk] for name, v in values.items()}, inputs, anodefree
+            )
+            for name, value in evaluated.items():
+                results[name][chunk] = value
+
+        columns = {
+            name: v.astype(dtype) if np.issubdtype(v.dtype, np.floating) else v
+            for name, v in values.items()
+        }
+        columns.update(results)
+        write_shard(directory, index, columns)
+
+        if manifest['columns'] is None:
+            manifest['columns'] = [
+                {
+                    'name': name,
+                    'dtype': v.dtype.str,
+                    'categories': inputs[name]['categories']
+                    if name in inputs and inputs[name]['kind'] == 'categorical' else None,
+                }
+                for name, v in columns.items()
+            ]
+        manifest['shards'].append({'file': shard_file(index), 'rows': size})
+        manifest['rows'] += size
+        write_manifest(directory, manifest)
+
+    manifest['complete'] = True
+    write_manifest(directory, manifest)
+    return manifest
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise ValueError(f'No dataset in {directory}')
+    with open(path) as file:
+        return json.load(file)
+
+
+def read_shards(directory, columns=None):
+    '''DataFrame of every shard in turn, materials as categoricals'''
+    manifest = read_manifest(directory)
+    schema = {c['name']: c for c in manifest['columns'] or []}
+    columns = columns or list(schema)
+    for shard in manifest['shards']:
+        with np.load(os.path.join(directory, shard['file'])) as data:
+            frame = {}
+            for name in columns:
+                categories = schema[name]['categories']
+                if categories is None:
+                    frame[name] = data[name]
+                else:
+                    frame[name] = pd.Categorical.from_codes(data[name], categories)
+        yield pd.DataFrame(frame)
+
+
+def load_dataset(directory, columns=None):
+    '''Whole dataset as one DataFrame, only for datasets that fit in memory'''
+    return pd.concat(list(read_shards(directory, columns)), ignore_index=True)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+'''
+Form factor explorer.
+
+Evaluates one electrode design over a dense grid of can dimensions in a
+single vectorised pass: the format dimensions of a variant of the cell are
+replaced with flattened numpy grids and the model is evaluated once.
+'''
+
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from validation import validate_cell
+from variants import evaluate_variant
+
+METRICS = [
+    'capacity',
+    'energy',
+    'total_mass',
+    'total_volume',
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+]
+
+
+def evaluate_grid(cell, cell_format, anodefree):
+    '''Evaluates a variant of the cell with array valued format dimensions,
+    cans too small for a single layer give zero capacity'''
+    return evaluate_variant(cell, {'format': cell_format}, anodefree)
+
+
+def grid_results(cell, columns):
+    '''Collects the metrics of an evaluated cell into a DataFrame,
+    grid points too small to fit the electrodes are set to NaN'''
+    results = pd.DataFrame(columns)
+    size = len(results)
+    feasible = validate_cell(cell, size)['feasible'].to_numpy()
+    results['Cathode length (mm)'] = np.broadcast_to(cell.cathode.width, size) * 10
+    results['Cathode height (mm)'] = np.broadcast_to(cell.cathode.height, size) * 10
+    for metric in METRICS:
+        results[metric] = np.where(
+            feasible, np.broadcast_to(getattr(cell, metric), size), np.nan
+        )
+    return results
+
+
+def generate_cylindrical_map(
+    cell, diameters, heights, can_thicknesses=None, mandrel_diams=None,
+    anodefree=False
+):
+    '''
+    Energy density of cylindrical cells for every combination of
+    diameters and heights (mm). Can thicknesses and mandrel diameters (mm)
+    are optional, by default the values of the cell format are used.
+    '''
+    if can_thicknesses is None:
+        can_thicknesses = [cell.format.can_thickness * 10]
+    if mandrel_diams is None:
+        mandrel_diams = [cell.format.mandrel_diam * 10]
+
+    grid = np.meshgrid(
+        diameters, heights, can_thicknesses, mandrel_diams, indexing='ij'
+    )
+    diameter, height, can_thickness, mandrel_diam = (g.ravel() for g in grid)
+
+    cylinders = replace(
+        cell.format,
+        diameter=diameter / 10,  # Convert mm to cm
+        height=height / 10,
+        can_thickness=can_thickness / 10,
+        mandrel_diam=mandrel_diam / 10,
+    )
+    evaluated = evaluate_grid(cell, cylinders, anodefree)
+
+    return grid_results(evaluated, {
+        'Diameter (mm)': diameter,
+        'Height (mm)': height,
+        'Can thickness (mm)': can_thickness,
+        'Mandrel diameter (mm)': mandrel_diam,
+    })
+
+
+def generate_prismatic_map(
+    cell, widths, heights, depths, structures=('Wound', 'Z-stacked'),
+    anodefree=False
+):
+    '''
+    Energy density of prismatic cells for every combination of can
+    widths, heights and depths (mm), evaluated for each cell structure.
+    '''
+    grid = np.meshgrid(widths, heights, depths, indexing='ij')
+    width, height, depth = (g.ravel() for g in grid)
+
+    results = []
+    for structure in structures:
+        cans = replace(
+            cell.format,
+            structure=structure,
+            width=width / 10,  # Convert mm to cm
+            height=height / 10,
+            depth=depth / 10,
+        )
+        evaluated = evaluate_grid(cell, cans, anodefree)
+
+        df = grid_results(evaluated, {
+            'Structure': structure,
+            'Width (mm)': width,
+            'Height (mm)': height,
+            'Depth (mm)': depth,
+        })
+        df['Number of layers'] = np.broadcast_to(evaluated.layers_number, len(df))
+        results.append(df)
+
+    return pd.concat(results, ignore_index=True)
@@ -1,52 +1,244 @@
+import time
 import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
-from copy import deepcopy
-
-def generate_energy_density_data(cell, parameter, start, end, steps, anodefree):
-    x_values = np.linspace(start, end, steps)
-    results = pd.DataFrame()
-
-    for x in x_values:
-        # Create a deep copy of the cell to avoid modifying the original
-        cell_copy = deepcopy(cell)
-
-        if parameter == 'Number of layers':
-            cell_copy.layers_number = int(x)
-        elif parameter == 'Cell size (height of cathode)':
-            cell_copy.cathode.height = x / 10  # Convert mm to cm
-            cell_copy.anode.height = cell_copy.cathode.height + 0.2
-            cell_copy.separator.height = cell_copy.anode.height + 0.2
-            from data import materials
-            cell_copy.format.height=cell_copy.separator.height + materials['formats']['pouch']['extra_height']
-        elif parameter == 'Cathode thickness (um)':
-            cell_copy.cathode.thickness = x / 10000  # Convert um to cm
-        elif parameter == 'Cathode porosity (%)':
-            cell_copy.cathode.porosity = x / 100  # Convert percentage to decimal
-        elif parameter == 'Cathode capacity (mAh/g)':
-            cell_copy.cathode.capacity = x
-        elif parameter == 'Cathode voltage (V)':
-            cell_copy.cathode.voltage = x
-        elif parameter == 'Extra mass (g)':
-            cell_copy.extra_mass = x
-        elif parameter == 'Can size (height) (mm)':
-            cell_copy.format.height = x
-        
-        cell_copy.anode.calculate_composite_density()
-        cell_copy.cathode.calculate_composite_density()
-        cell_copy.cathode.calculate_areal_capacity()
-        cell_copy.calculate_anode_properties()
-        cell_copy.calculate_energy_density()
-        if anodefree:
-            cell_copy.anode_free_energy()
-
-        df = pd.DataFrame([cell_copy])
-        df[parameter] = x
-        results = pd.concat([results, df], ignore_index=True)
+import metrics
+from data import materials
+from batch import PRECISIONS, cell_frame, chunk_size_for_budget, chunk_slices
+from singleflight import FLIGHTS, flight_key
+from validation import validate
+from variants import evaluate_variant
+
+def sweep_key(
+    cache, cell, parameter, start, end, steps, anodefree,
+    precision='float64', adaptive=False
+):
+    return cache.key(
+        cell, parameter=parameter, start=start, end=end, steps=steps,
+        anodefree=anodefree, precision=precision, adaptive=adaptive
+    )
+
+
+def generate_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, cache=None,
+    memory_budget=None, precision='float64'
+):
+    '''Results of the sweep, identical sweeps running at the same time in
+    other sessions are computed only once'''
+    key = flight_key(
+        cell, request='sweep', parameter=parameter, start=start, end=end,
+        steps=steps, anodefree=anodefree, precision=precision, cached=cache is not None
+    )
+    results, _ = FLIGHTS.do(
+        key, compute_energy_density_data, cell, parameter, start, end, steps,
+        anodefree, cache, memory_budget, precision
+    )
+    return results
+
+
+def compute_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, cache=None,
+    memory_budget=None, precision='float64'
+):
+    if cache is not None:
+        key = sweep_key(
+            cache, cell, parameter, start, end, steps, anodefree, precision
+        )
+        cached = cache.get(key)
+        metrics.observe_cache(cached is not None, 0 if cached is None else len(cached))
+        if cached is not None:
+            return cached
+
+    start_time = time.perf_counter()
+    results = pd.concat(
+        iter_energy_density_data(
+            cell, parameter, start, end, steps, anodefree,
+            memory_budget=memory_budget, precision=precision
+        ),
+        ignore_index=True
+    )
+    metrics.observe_sweep(steps, len(results), time.perf_counter() - start_time)
+
+    if cache is not None:
+        cache.put(key, results)
 
     return results
 
-def plot_energy_density(df, parameter):
+
+def sweep_values(start, end, steps, begin=0, stop=None, precision='float64'):
+    '''Values begin:stop of np.linspace(start, end, steps), computed
+    without creating the whole array'''
+    stop = steps if stop is None else stop
+    if steps == 1:
+        x_values = np.array([start], dtype=float)[begin:stop]
+    else:
+        x_values = np.arange(begin, stop, dtype=float) * ((end - start) / (steps - 1)) + start
+        if stop == steps and stop > begin:
+            x_values[-1] = end
+    return x_values.astype(PRECISIONS[precision])
+
+
+def iter_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, chunk_size=None,
+    memory_budget=None, precision='float64'
+):
+    '''
+    Yields the sweep results in chunks, so that callers can show progress
+    or stop early. Every chunk is evaluated in one vectorised pass, its
+    size is chunk_size points or as many as fit memory_budget (bytes).
+    '''
+    if chunk_size is None:
+        if memory_budget is not None:
+            chunk_size = chunk_size_for_budget(memory_budget, precision)
+        else:
+            chunk_size = steps
+
+    for chunk in chunk_slices(steps, chunk_size):
+        yield evaluate_chunk(
+            cell, parameter, start, end, steps, anodefree, chunk, precision
+        )
+
+
+def evaluate_chunk(cell, parameter, start, end, steps, anodefree, chunk, precision='float64'):
+    x_values = sweep_values(start, end, steps, chunk.start, chunk.stop, precision)
+    return evaluate_values(
+        cell, parameter, x_values, anodefree, precision,
+        index=pd.RangeIndex(chunk.start, chunk.stop)
+    )
+
+
+def evaluate_values(cell, parameter, x_values, anodefree, precision='float64', index=None):
+    '''Evaluates all parameter values in one vectorised pass'''
+    # invalid designs (e.g. zero capacity) give inf or nan instead of raising
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cell_copy = evaluate_parameter(cell, parameter, x_values, anodefree)
+    df = cell_frame(cell_copy, len(x_values), precision, index=index)
+    df[parameter] = x_values
+    df['feasible'] = validate(df)['feasible']
+    return df
+
+
+def generate_adaptive_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, tolerance=0.001
+):
+    '''Adaptive counterpart of generate_energy_density_data,
+    sorted by the parameter value'''
+    results = pd.concat(
+        iter_adaptive_energy_density_data(
+            cell, parameter, start, end, steps, anodefree, tolerance
+        ),
+        ignore_index=True
+    )
+    return results.sort_values(parameter, ignore_index=True)
+
+
+def iter_adaptive_energy_density_data(
+    cell, parameter, start, end, steps, anodefree, tolerance=0.001
+):
+    '''
+    Sweep that spends at most steps evaluations where the curves bend.
+    Starts from a coarse uniform grid, then repeatedly evaluates the
+    midpoints of the intervals around which the slope changes the most,
+    e.g. where the limiting electrode switches or the layer count jumps.
+    Stops when the estimated error of linear interpolation is below
+    tolerance (relative to the range of the curve) everywhere.
+    Yields the newly evaluated points of every round.
+    '''
+    if steps < 3:
+        # too few points to find bends, same as the uniform sweep
+        yield from iter_energy_density_data(cell, parameter, start, end, steps, anodefree)
+        return
+
+    curves = ['gravimetric_energy_density', 'volumetric_energy_density']
+    x_values = sweep_values(start, end, min(steps, max(3, steps // 5)))
+    df = evaluate_values(cell, parameter, x_values, anodefree)
+    yield df
+
+    x = x_values
+    y = df[curves].to_numpy()
+    # layer counts are whole numbers, finer steps never change the result
+    min_width = 1 if parameter == 'Number of layers' else abs(end - start) / (4 * steps)
+
+    while len(x) < steps:
+        order = np.argsort(x)
+        x, y = x[order], y[order]
+        width = np.diff(x)
+        slope = np.diff(y, axis=0) / width[:, None]
+        # slope change on either side of each interval
+        bend = np.abs(np.diff(slope, axis=0))
+        bend = np.maximum(
+            np.vstack([bend[:1] * 0, bend]), np.vstack([bend, bend[-1:] * 0])
+        )
+        scale = np.nanmax(y, axis=0) - np.nanmin(y, axis=0)
+        scale[~(scale > 0)] = 1
+        # a slope change within an interval misses the curve by ~ bend * width / 4
+        error = np.nan_to_num((bend * width[:, None] / 4 / scale).max(axis=1))
+        error[width / 2 < min_width] = 0
+
+        candidates = np.flatnonzero(error > tolerance)
+        if len(candidates) == 0:
+            break
+        candidates = candidates[np.argsort(-error[candidates])][:steps - len(x)]
+
+        x_new = x[candidates] + width[candidates] / 2
+        df = evaluate_values(cell, parameter, x_new, anodefree)
+        yield df
+
+        x = np.concatenate([x, x_new])
+        y = np.vstack([y, df[curves].to_numpy()])
+
+
+def evaluate_parameter(cell, parameter, x, anodefree):
+    return evaluate_parameters(cell, {parameter: x}, anodefree)
+
+
+def evaluate_parameters(cell, values, anodefree):
+    '''Evaluates a variant of the cell with several parameters set at once,
+    values maps parameter names to values or arrays of values'''
+    overrides = {}
+    for parameter, x in values.items():
+        overrides.update(parameter_overrides(parameter, x))
+    return evaluate_variant(cell, overrides, anodefree)
+
+
+def parameter_overrides(parameter, x):
+    '''Cell inputs (dotted names) set by a sweep parameter value'''
+    if parameter == 'Number of layers':
+        return {'layers_number': np.trunc(x).astype(int)}
+    elif parameter == 'Cell size (height of cathode)':
+        height = x / 10  # Convert mm to cm
+        return {
+            'cathode.height': height,
+            'anode.height': height + 0.2,
+            'separator.height': height + 0.4,
+            'format.height': height + 0.4 + materials['formats']['pouch']['extra_height'],
+        }
+    elif parameter == 'Cathode thickness (um)':
+        return {'cathode.thickness': x / 10000}  # Convert um to cm
+    elif parameter == 'Cathode porosity (%)':
+        return {'cathode.porosity': x / 100}  # Convert percentage to decimal
+    elif parameter == 'Cathode capacity (mAh/g)':
+        return {'cathode.capacity': x}
+    elif parameter == 'Cathode voltage (V)':
+        return {'cathode.voltage': x}
+    elif parameter == 'Extra mass (g)':
+        return {'extra_mass': x}
+    elif parameter == 'Can size (height) (mm)':
+        return {'format.height': x / 10}  # Convert mm to cm
+    return {}
+
+def plot_energy_density(df, parameter, max_points=2000):
+    if not isinstance(df, pd.DataFrame):
+        # lazy result set (columnar.ColumnStore), read only the points plotted
+        df = df.downsample(
+            parameter,
+            ['gravimetric_energy_density', 'volumetric_energy_density'],
+            max_points,
+            columns=[c for c in ['feasible'] if c in df.columns],
+        )
+    if 'feasible' in df:
+        # infeasible designs would plot as garbage, leave gaps instead
+        df = df.where(df['feasible'])
     fig = go.Figure()
     
     fig.add_trace(go.Scatter(x=df[parameter], y=df['gravimetric_energy_density'], 
@@ -62,3 +254,99 @@ def plot_energy_density(df, parameter):
     )
     
     return fig
+
+
+def plot_form_factor_map(df, x, y, metric):
+    grid = df.pivot_table(index=y, columns=x, values=metric)
+
+    fig = go.Figure(go.Heatmap(
+        x=grid.columns, y=grid.index, z=grid.values,
+        colorbar_title=metric.replace('_', ' ').capitalize()
+    ))
+
+    fig.update_layout(
+        title=f'{metric.replace("_", " ").capitalize()} vs {x} and {y}',
+        xaxis_title=x,
+        yaxis_title=y,
+    )
+
+    return fig
+
+
+def plot_cycle_life(projection, names):
+    fig = go.Figure()
+
+    for name, values in zip(names, projection.gravimetric_energy_density):
+        fig.add_trace(go.Scatter(x=projection.cycles, y=values, mode='lines', name=name))
+
+    fig.update_layout(
+        title='Specific Energy vs Cycle Number',
+        xaxis_title='Cycle number',
+        yaxis_title='Specific Energy (Wh/kg)',
+    )
+
+    return fig
+
+
+def plot_lifetime_energy(df, parameter):
+    fig = go.Figure(go.Scatter(
+        x=df[parameter], y=df['lifetime_energy'] / 1000, mode='lines'
+    ))
+
+    fig.update_layout(
+        title=f'Lifetime Energy Throughput vs {parameter.capitalize()}',
+        xaxis_title=parameter.capitalize(),
+        yaxis_title='Lifetime energy (kWh)',
+    )
+
+    return fig
+
+
+def plot_format_comparison(table, metric, unit):
+    '''Bars of a metric of the same chemistry in every format'''
+    fig = go.Figure(go.Bar(
+        x=table.index, y=table[metric],
+        text=[f'{v:.1f}' for v in table[metric]], textposition='auto',
+    ))
+
+    fig.update_layout(
+        title=f'{metric.replace("_", " ").capitalize()} by Format',
+        xaxis_title='Format',
+        yaxis_title=unit,
+    )
+
+    return fig
+
+
+def plot_lot_distribution(lot, metric, title, unit):
+    '''Histogram of a metric over the cells of a simulated lot'''
+    fig = go.Figure(go.Histogram(x=getattr(lot, metric), nbinsx=60))
+    fig.add_vline(x=lot.nominal[metric], line_dash='dash', annotation_text='Nominal')
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=unit,
+        yaxis_title='Cells',
+    )
+
+    return fig
+
+
+def plot_breakdown(breakdown, title, unit):
+    '''Horizontal bars of the share of every component'''
+    names = [name.replace('_cc', ' current collector').capitalize() for name in breakdown]
+    values = np.array([float(v) for v in breakdown.values()])
+    share = values / values.sum() * 100
+
+    fig = go.Figure(go.Bar(
+        x=values, y=names, orientation='h',
+        text=[f'{s:.1f} %' for s in share], textposition='auto',
+    ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=unit,
+        yaxis={'autorange': 'reversed'},
+    )
+
+    return fig
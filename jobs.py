@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+'''
+Background jobs for energy density sweeps.
+
+A sweep runs on a worker thread in chunks, so the app can show partial
+results and progress while it runs and cancel it between chunks.
+
+Identical sweeps started in several sessions are computed once: the first
+job leads and the others follow its chunks. Every job can still be
+cancelled on its own, a follower takes over if its leader is cancelled.
+'''
+
+import threading
+import time
+from copy import deepcopy
+
+import pandas as pd
+
+import metrics
+from graphs import (
+    iter_adaptive_energy_density_data,
+    iter_energy_density_data,
+    sweep_key,
+)
+from singleflight import FLIGHTS, flight_key
+
+# how often a job following an identical job checks for new chunks (s)
+FOLLOW_INTERVAL = 0.05
+
+
+class SweepJob:
+    def __init__(
+        self, cell, parameter, start, end, steps, anodefree,
+        cache=None, chunk_size=5, adaptive=False
+    ):
+        self.cell = deepcopy(cell)
+        self.parameter = parameter
+        self.start_value = start
+        self.end_value = end
+        self.steps = steps
+        self.anodefree = anodefree
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.adaptive = adaptive
+        self.error = None
+        self._complete = False
+        self._chunks = []
+        self._points_done = 0
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def complete(self):
+        '''True only if the sweep has finished without being cancelled'''
+        return self._complete
+
+    @property
+    def points_done(self):
+        with self._lock:
+            return self._points_done
+
+    @property
+    def progress(self):
+        return self.points_done / self.steps
+
+    def result(self):
+        '''Results of all chunks finished so far'''
+        with self._lock:
+            chunks = list(self._chunks)
+        if not chunks:
+            return pd.DataFrame()
+        df = pd.concat(chunks, ignore_index=True)
+        if self.adaptive:
+            # refinement points arrive out of order
+            df = df.sort_values(self.parameter, ignore_index=True)
+        return df
+
+    def _add_chunk(self, df):
+        with self._lock:
+            self._chunks.append(df)
+            self._points_done += len(df)
+
+    def _sync(self, leader):
+        '''Copies the chunks the leader has finished since the last call'''
+        with leader._lock:
+            chunks = leader._chunks[len(self._chunks):]
+        for df in chunks:
+            self._add_chunk(df)
+
+    def _follow(self, leader):
+        '''Follows the chunks of an identical job until it ends.
+        Returns True if this job is finished, False to compute itself.'''
+        while not self.cancelled:
+            leader.wait(FOLLOW_INTERVAL)
+            self._sync(leader)
+            if not leader.running:
+                break
+        if self.cancelled:
+            return True
+        if leader.error is not None:
+            self.error = leader.error
+            return True
+        if leader.complete:
+            self._complete = True
+            return True
+        # the leader was cancelled, start again
+        with self._lock:
+            self._chunks = []
+            self._points_done = 0
+        return False
+
+    def _run(self):
+        sweep = (
+            self.cell, self.parameter, self.start_value, self.end_value,
+            self.steps, self.anodefree
+        )
+        flight = flight_key(
+            self.cell, request='sweep_job', parameter=self.parameter,
+            start=self.start_value, end=self.end_value, steps=self.steps,
+            anodefree=self.anodefree, adaptive=self.adaptive,
+            chunk_size=self.chunk_size,
+        )
+        try:
+            if self.cache is not None:
+                key = sweep_key(self.cache, *sweep, adaptive=self.adaptive)
+                cached = self.cache.get(key)
+                metrics.observe_cache(cached is not None, 0 if cached is None else len(cached))
+                if cached is not None:
+                    self._add_chunk(cached)
+                    self._complete = True
+                    return
+
+            leader = FLIGHTS.lead(flight, self)
+            while leader is not self:
+                if self._follow(leader):
+                    return
+                leader = FLIGHTS.lead(flight, self)
+
+            try:
+                self._compute(sweep)
+            finally:
+                FLIGHTS.land(flight, self)
+
+            if self._complete and self.cache is not None:
+                self.cache.put(key, self.result())
+        except Exception as e:
+            self.error = e
+
+    def _compute(self, sweep):
+        if self.adaptive:
+            chunks = iter_adaptive_energy_density_data(*sweep)
+        else:
+            chunks = iter_energy_density_data(*sweep, chunk_size=self.chunk_size)
+        start = time.perf_counter()
+        for df in chunks:
+            if self.cancelled:
+                return
+            self._add_chunk(df)
+        self._complete = True
+        metrics.observe_sweep(
+            self.points_done, self.points_done, time.perf_counter() - start
+        )
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+'''
+Headless load test of the Streamlit app.
+
+Simulates concurrent user sessions with Streamlit's app testing API, no
+browser or network needed. Every session loads the app, changes cell inputs
+and generates energy density graphs. Reports latency percentiles of every
+rerun, process memory per session and rerun throughput, e.g.
+
+    python loadtest.py --sessions 16 --iterations 5
+'''
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+GRAPH_PARAMETERS = [
+    'Cathode thickness (um)',
+    'Cathode porosity (%)',
+    'Cathode capacity (mAh/g)',
+]
+PERCENTILES = [50, 90, 95, 99]
+
+# AppTest installs a process wide runtime for every run, so reruns of
+# different sessions can't overlap. Like the GIL in one server process this
+# queues them, the waiting counts towards the latency. Graph sweeps still
+# run concurrently on their worker threads.
+RERUN_LOCK = threading.Lock()
+
+
+class Session:
+    '''One simulated user, records the duration of every rerun'''
+
+    def __init__(self, seed, timeout=120):
+        self.app = AppTest.from_file(APP, default_timeout=timeout)
+        self.random = random.Random(seed)
+        self.timings = []
+        self.errors = []
+
+    def rerun(self, step, action=None):
+        start = time.perf_counter()
+        with RERUN_LOCK:
+            if action is None:
+                self.app.run()
+            else:
+                action().run()
+        self.timings.append((step, time.perf_counter() - start))
+        if self.app.exception:
+            self.errors.append(f'{step}: {self.app.exception[0].value}')
+
+    def widget(self, elements, label):
+        return next(e for e in elements if e.label == label)
+
+    def update_cell(self):
+        self.widget(self.app.slider, 'Cathode thickness (um)').set_value(
+            self.random.randint(40, 150)
+        )
+        self.widget(self.app.slider, 'Porosity (%)').set_value(
+            self.random.randint(15, 40)
+        )
+        # inputs are applied together with the form submit button
+        self.rerun('update cell', self.widget(self.app.button, 'Update cell').click)
+
+    def generate_graph(self, steps):
+        self.widget(self.app.selectbox, 'Select parameter to vary').set_value(
+            self.random.choice(GRAPH_PARAMETERS)
+        )
+        self.widget(self.app.slider, 'Number of steps').set_value(steps)
+        self.rerun('generate graph', self.widget(self.app.button, 'Generate Graph').click)
+        job = self.app.session_state['sweep_job'] if 'sweep_job' in self.app.session_state else None
+        if job is not None:
+            job.wait()
+        self.rerun('show graph')
+
+    def run(self, iterations, steps):
+        try:
+            self.rerun('load')
+            for _ in range(iterations):
+                self.update_cell()
+                self.generate_graph(steps)
+        except Exception as e:
+            self.errors.append(repr(e))
+
+
+def percentiles(timings):
+    '''Latency percentiles in ms of every kind of rerun'''
+    df = pd.DataFrame(timings, columns=['step', 'seconds'])
+    rows = {}
+    for step, group in [('all', df)] + list(df.groupby('step', sort=False)):
+        ms = group['seconds'].to_numpy() * 1000
+        rows[step] = {
+            'reruns': len(ms),
+            **{f'p{p}': np.percentile(ms, p) for p in PERCENTILES},
+            'max': ms.max(),
+        }
+    return pd.DataFrame(rows).T
+
+
+def peak_memory():
+    '''Peak resident memory of the process in MB'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def run_load_test(sessions=8, iterations=3, steps=50, seed=0):
+    '''
+    Runs the sessions concurrently, one thread each. Returns a dict with the
+    latency percentiles (ms), throughput (reruns/s), growth of the peak
+    process memory per session (MB) and any errors.
+    '''
+    # imports and first time setup are not part of the measurement
+    Session(seed - 1).rerun('warm up')
+    baseline = peak_memory()
+
+    users = [Session(seed + i) for i in range(sessions)]
+
+    threads = [
+        threading.Thread(target=user.run, args=(iterations, steps))
+        for user in users
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    peak = peak_memory()
+    memory = (peak - baseline) / sessions if peak is not None else None
+
+    timings = [t for user in users for t in user.timings]
+    return {
+        'sessions': sessions,
+        'wall_time': wall_time,
+        'throughput': len(timings) / wall_time,
+        'latency': percentiles(timings),
+        'memory_per_session': memory,
+        'peak_memory': peak,
+        'errors': [e for user in users for e in user.errors],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sessions', type=int, default=8, help='concurrent sessions')
+    parser.add_argument('--iterations', type=int, default=3, help='input changes and graphs per session')
+    parser.add_argument('--steps', type=int, default=50, help='points per energy density graph')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--workdir', default=None,
+        help='directory for the result cache and store, a new temporary one by default'
+    )
+    args = parser.parse_args()
+
+    # start with an empty result cache, so graphs are really computed
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix='wattcell_loadtest_'))
+    report = run_load_test(
+        args.sessions, args.iterations, args.steps, args.seed
+    )
+
+    print(f'Sessions: {report["sessions"]}, wall time: {report["wall_time"]:.1f} s')
+    print(f'Throughput: {report["throughput"]:.2f} reruns/s')
+    if report['memory_per_session'] is not None:
+        print(
+            f'Memory per session: {report["memory_per_session"]:.1f} MB '
+            f'(peak {report["peak_memory"]:.1f} MB in total)'
+        )
+    print('Rerun latency (ms):')
+    print(report['latency'].round(1).to_string())
+    for error in report['errors']:
+        print('Error:', error)
+
+
+if __name__ == '__main__':
+    main()
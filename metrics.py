@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+'''
+Opt-in metrics of the calculations in Prometheus text format.
+
+Counters and latency histograms of cell evaluations (per cell format),
+energy density sweeps and result cache lookups. Nothing is recorded until
+metrics are enabled, so the calculations pay only for a flag check.
+
+When WattCell runs as a long-lived service, set WATTCELL_METRICS_PORT (and
+optionally WATTCELL_METRICS_HOST, 127.0.0.1 by default) before starting the
+app, or call serve() from your own process. The metrics are then served at
+http://127.0.0.1:<port>/metrics for Prometheus to scrape.
+'''
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT_VARIABLE = 'WATTCELL_METRICS_PORT'
+HOST_VARIABLE = 'WATTCELL_METRICS_HOST'
+DEFAULT_HOST = '127.0.0.1'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# upper bounds in seconds, from a single cell to a very large sweep
+LATENCY_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60,
+)
+
+_enabled = False
+_lock = threading.Lock()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for _, v in pairs
+    )
+    return '{' + ','.join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    '''Monotonically increasing count, one per combination of labels'''
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, *labels):
+        if not _enabled:
+            return
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        return [
+            (self.name, format_labels(self.labels, labels), value)
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Histogram:
+    '''Cumulative bucket counts, sum and count of observed values'''
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels: [bucket counts, sum, count]
+
+    def observe(self, value, *labels):
+        if not _enabled:
+            return
+        with _lock:
+            counts, total, count = self.values.get(
+                labels, ([0] * len(self.buckets), 0.0, 0)
+            )
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                counts[i] += 1
+            self.values[labels] = (counts, total + value, count + 1)
+
+    def samples(self):
+        samples = []
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                samples.append((
+                    f'{self.name}_bucket',
+                    format_labels(self.labels, labels, [('le', format_value(float(bound)))]),
+                    cumulative,
+                ))
+            samples.append((
+                f'{self.name}_bucket',
+                format_labels(self.labels, labels, [('le', '+Inf')]),
+                count,
+            ))
+            samples.append((f'{self.name}_sum', format_labels(self.labels, labels), total))
+            samples.append((f'{self.name}_count', format_labels(self.labels, labels), count))
+        return samples
+
+
+CELL_EVALUATIONS = Counter(
+    'wattcell_cell_evaluations_total',
+    'Cell evaluations (calculate_energy_density calls)', ['format'],
+)
+CELL_DESIGNS = Counter(
+    'wattcell_cell_designs_evaluated_total',
+    'Designs evaluated, one per element of array valued inputs', ['format'],
+)
+CELL_SECONDS = Histogram(
+    'wattcell_cell_evaluation_seconds',
+    'Duration of cell evaluations', ['format'],
+)
+SWEEPS = Counter(
+    'wattcell_sweeps_total', 'Energy density sweeps computed (cache misses only)',
+)
+SWEEP_POINTS = Counter(
+    'wattcell_sweep_points_total', 'Parameter values evaluated by sweeps',
+)
+SWEEP_ROWS = Counter(
+    'wattcell_sweep_rows_exported_total',
+    'Result rows returned by sweeps, including cached results',
+)
+SWEEP_SECONDS = Histogram(
+    'wattcell_sweep_seconds', 'Duration of computed energy density sweeps',
+)
+CACHE_REQUESTS = Counter(
+    'wattcell_cache_requests_total', 'Result cache lookups of sweeps', ['result'],
+)
+
+REGISTRY = [
+    CELL_EVALUATIONS,
+    CELL_DESIGNS,
+    CELL_SECONDS,
+    SWEEPS,
+    SWEEP_POINTS,
+    SWEEP_ROWS,
+    SWEEP_SECONDS,
+    CACHE_REQUESTS,
+]
+
+
+def observe_evaluation(cell_format, designs, seconds):
+    if not _enabled:
+        return
+    CELL_EVALUATIONS.inc(1, cell_format)
+    CELL_DESIGNS.inc(designs, cell_format)
+    CELL_SECONDS.observe(seconds, cell_format)
+
+
+def observe_sweep(points, rows, seconds):
+    if not _enabled:
+        return
+    SWEEPS.inc()
+    SWEEP_POINTS.inc(points)
+    SWEEP_ROWS.inc(rows)
+    SWEEP_SECONDS.observe(seconds)
+
+
+def observe_cache(hit, rows=0):
+    '''Records a cache lookup, rows of a hit count as exported sweep rows'''
+    if not _enabled:
+        return
+    CACHE_REQUESTS.inc(1, 'hit' if hit else 'miss')
+    if hit:
+        SWEEP_ROWS.inc(rows)
+
+
+def render(registry=REGISTRY):
+    '''All metrics in the Prometheus text exposition format'''
+    lines = []
+    with _lock:
+        for metric in registry:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes every few seconds would flood the app log
+        pass
+
+
+def serve(port, host=DEFAULT_HOST):
+    '''Enables metrics and serves them on a daemon thread,
+    returns the server (server.shutdown() stops it)'''
+    enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_from_env():
+    '''Starts the metrics server if WATTCELL_METRICS_PORT is set,
+    returns the server or None'''
+    port = os.environ.get(PORT_VARIABLE)
+    if not port:
+        return None
+    return serve(int(port), os.environ.get(HOST_VARIABLE, DEFAULT_HOST))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+'''
+Module and pack level aggregation of cell designs.
+
+All functions broadcast cell designs against pack topologies, so thousands
+of cells can be screened against many topologies in a single numpy pass,
+or pair every cell design with its own topology, e.g. one sized for it.
+'''
+
+from dataclasses import asdict, dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class Pack:
+    series: int
+    parallel: int
+    cells_per_module: int = 12
+    cell_overhead_mass: float = 0  # g per cell (holders, busbars, cooling)
+    cell_overhead_volume: float = 0  # cm³ per cell
+    module_overhead_mass: float = 0  # g per module (housing, electronics)
+    module_overhead_volume: float = 0  # cm³ per module
+    pack_overhead_mass: float = 0  # g (enclosure, BMS, wiring)
+    pack_overhead_volume: float = 0  # cm³
+
+
+CELL_COLUMNS = ['voltage', 'capacity', 'energy', 'total_mass', 'total_volume']
+PACK_COLUMNS = [f.name for f in fields(Pack)]
+
+
+def cell_metrics(cells):
+    '''Metrics needed for pack aggregation from a list of evaluated Cells'''
+    return pd.DataFrame({
+        'voltage': [c.cathode.voltage - c.anode.voltage for c in cells],  # V
+        'capacity': [c.capacity for c in cells],  # Ah
+        'energy': [c.energy for c in cells],  # Wh
+        'total_mass': [c.total_mass for c in cells],  # g
+        'total_volume': [c.total_volume for c in cells],  # cm³
+    })
+
+
+def topologies(packs):
+    '''DataFrame with one row per Pack'''
+    return pd.DataFrame([asdict(p) for p in packs])
+
+
+def cell_counts(target, per_cell, quantity):
+    '''Cells needed to reach target with per_cell each, raises ValueError
+    for designs that can't reach it (zero, negative or non finite values)'''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = target / per_cell
+    unsizable = ~np.isfinite(ratio) | (ratio <= 0)
+    if unsizable.any():
+        designs = ', '.join(map(str, np.flatnonzero(unsizable)))
+        raise ValueError(f'Cell designs {designs} have no positive {quantity} to size a pack')
+    return np.ceil(ratio).astype(int)
+
+
+def size_packs(cells, target_voltage=None, target_energy=None, series=1, **overheads):
+    '''
+    Smallest topology of every cell design reaching the target pack
+    voltage (V) and energy (Wh), at least one of them is needed. With only
+    a target voltage packs have one cell in parallel. With only a target
+    energy packs have series cells in series (1 by default, so all cells
+    are in parallel) and enough in parallel to reach the energy.
+    Overheads are passed to each Pack.
+    '''
+    if target_voltage is None and target_energy is None:
+        raise ValueError('A pack needs a target voltage or energy to be sized')
+    if target_voltage is None:
+        series = np.full(len(cells), int(series))
+    else:
+        series = cell_counts(
+            target_voltage, np.asarray(cells['voltage'], dtype=float), 'voltage'
+        )
+    if target_energy is None:
+        parallel = np.ones(len(cells), dtype=int)
+    else:
+        parallel = cell_counts(
+            target_energy, series * np.asarray(cells['energy'], dtype=float), 'energy'
+        )
+    return [Pack(int(s), int(p), **overheads) for s, p in zip(series, parallel)]
+
+
+def evaluate_packs(cells, packs, target_voltage=None, target_energy=None, paired=False):
+    '''
+    Pack level mass, volume, energy and energy densities for every
+    combination of cell design (rows of cells) and topology (rows of packs).
+    Returns one row per combination, with cell and pack indices.
+    paired evaluates every cell design only with the topology in the same
+    row instead, e.g. the topologies from size_packs.
+    '''
+    # cells along the first axis, topologies along the second unless paired
+    c = {k: np.asarray(cells[k], dtype=float)[:, None] for k in CELL_COLUMNS}
+    if paired:
+        if len(cells) != len(packs):
+            raise ValueError(f'{len(cells)} cell designs can\'t be paired with {len(packs)} packs')
+        p = {k: np.asarray(packs[k])[:, None] for k in PACK_COLUMNS}
+        cell_index = pack_index = np.arange(len(cells))[:, None]
+    else:
+        p = {k: np.asarray(packs[k])[None, :] for k in PACK_COLUMNS}
+        cell_index = np.arange(len(cells))[:, None]
+        pack_index = np.arange(len(packs))[None, :]
+
+    cells_number = p['series'] * p['parallel']
+    modules_number = np.ceil(cells_number / p['cells_per_module'])
+
+    voltage = c['voltage'] * p['series']  # V
+    capacity = c['capacity'] * p['parallel']  # Ah
+    energy = c['energy'] * cells_number  # Wh
+    total_mass = (
+        cells_number * (c['total_mass'] + p['cell_overhead_mass'])
+        + modules_number * p['module_overhead_mass']
+        + p['pack_overhead_mass']
+    )  # g
+    total_volume = (
+        cells_number * (c['total_volume'] + p['cell_overhead_volume'])
+        + modules_number * p['module_overhead_volume']
+        + p['pack_overhead_volume']
+    )  # cm³
+
+    shape = energy.shape
+    results = pd.DataFrame({
+        'cell': np.broadcast_to(cell_index, shape).ravel(),
+        'pack': np.broadcast_to(pack_index, shape).ravel(),
+        'series': np.broadcast_to(p['series'], shape).ravel(),
+        'parallel': np.broadcast_to(p['parallel'], shape).ravel(),
+        'cells_number': np.broadcast_to(cells_number, shape).ravel(),
+        'modules_number': np.broadcast_to(modules_number, shape).ravel().astype(int),
+        'voltage': voltage.ravel(),
+        'capacity': capacity.ravel(),
+        'energy': energy.ravel(),
+        'total_mass': total_mass.ravel(),
+        'total_volume': total_volume.ravel(),
+        'gravimetric_energy_density': (energy / total_mass * 1000).ravel(),  # Wh/kg
+        'volumetric_energy_density': (energy / total_volume * 1000).ravel(),  # Wh/L
+    })
+    if target_voltage is not None:
+        results['meets_voltage'] = results['voltage'] >= target_voltage
+    if target_energy is not None:
+        results['meets_energy'] = results['energy'] >= target_energy
+    return results
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+'''
+Analytic sensitivities of a cell design.
+
+Every numeric input of the cell is replaced by a dual number carrying its
+gradient with respect to all inputs, then the usual calculation chain is run
+once (forward-mode differentiation). The partial derivatives of all results
+with respect to all inputs come out of this single pass, without the k + 1
+evaluations of finite differences.
+'''
+
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+import pandas as pd
+
+from variants import evaluate_variant
+
+METRICS = [
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+    'capacity',
+    'energy',
+    'total_mass',
+]
+
+
+class Dual:
+    '''Value with its gradient with respect to all seeded inputs'''
+
+    def __init__(self, value, grad=0):
+        self.value = value
+        self.grad = grad
+
+    def __add__(self, other):
+        other = as_dual(other)
+        return Dual(self.value + other.value, self.grad + other.grad)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = as_dual(other)
+        return Dual(self.value - other.value, self.grad - other.grad)
+
+    def __rsub__(self, other):
+        return as_dual(other) - self
+
+    def __mul__(self, other):
+        other = as_dual(other)
+        return Dual(
+            self.value * other.value,
+            self.grad * other.value + self.value * other.grad
+        )
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        other = as_dual(other)
+        return Dual(
+            self.value / other.value,
+            (self.grad * other.value - self.value * other.grad) / other.value**2
+        )
+
+    def __rtruediv__(self, other):
+        return as_dual(other) / self
+
+    def __neg__(self):
+        return Dual(-self.value, -self.grad)
+
+    def __pow__(self, exponent):
+        # only constant exponents appear in the model
+        return Dual(
+            self.value**exponent,
+            exponent * self.value ** (exponent - 1) * self.grad
+        )
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # called for numpy functions and for numpy scalars on the left side
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        if ufunc in BINARY_UFUNCS:
+            a, b = (as_dual(x) for x in inputs)
+            return BINARY_UFUNCS[ufunc](a, b)
+        x = as_dual(inputs[0])
+        if ufunc is np.negative:
+            return -x
+        if ufunc is np.log:
+            return Dual(np.log(x.value), x.grad / x.value)
+        if ufunc is np.sqrt:
+            return x**0.5
+        if ufunc in (np.trunc, np.floor, np.ceil):
+            # piecewise constant, the derivative is zero
+            return ufunc(x.value)
+        return NotImplemented
+
+
+def as_dual(x):
+    return x if isinstance(x, Dual) else Dual(x)
+
+
+BINARY_UFUNCS = {
+    np.add: lambda a, b: a + b,
+    np.subtract: lambda a, b: a - b,
+    np.multiply: lambda a, b: a * b,
+    np.divide: lambda a, b: a / b,
+    np.power: lambda a, b: a**b.value,
+    np.minimum: lambda a, b: a if a.value <= b.value else b,
+    np.maximum: lambda a, b: a if a.value >= b.value else b,
+}
+
+
+def numeric_inputs(obj, prefix=''):
+    '''(name, container, key) of every numeric input field of a cell,
+    nested components are joined with dots, e.g. cathode.thickness'''
+    for f in fields(obj):
+        if not f.init:
+            continue
+        value = getattr(obj, f.name)
+        name = prefix + f.name
+        if is_dataclass(value):
+            yield from numeric_inputs(value, name + '.')
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    yield f'{name}.{k}', value, k
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, obj, f.name
+
+
+def evaluate_duals(cell, anodefree=False):
+    '''Variant of the cell evaluated with all numeric inputs seeded as duals.
+    Returns the evaluated variant and the names of the inputs.'''
+    inputs = list(numeric_inputs(cell))
+    seeds = np.eye(len(inputs))
+    overrides = {}
+    for (name, container, key), seed in zip(inputs, seeds):
+        value = container[key] if isinstance(container, dict) else getattr(container, key)
+        # float64 values give inf or nan for invalid designs instead of raising
+        overrides[name] = Dual(np.float64(value), seed)
+    return evaluate_variant(cell, overrides, anodefree), [name for name, _, _ in inputs]
+
+
+def sensitivities(cell, anodefree=False, metrics=METRICS):
+    '''
+    Partial derivatives of the metrics (columns) with respect to every
+    numeric input of the cell (rows), in the units of the cell fields.
+    Inputs that the model recalculates, e.g. the anode thickness, are zero.
+    '''
+    evaluated, names = evaluate_duals(cell, anodefree)
+    jacobian = {}
+    for metric in metrics:
+        result = as_dual(getattr(evaluated, metric))
+        jacobian[metric] = np.broadcast_to(result.grad, len(names))
+    return pd.DataFrame(jacobian, index=names)
+
+
+def elasticities(cell, anodefree=False, metrics=METRICS):
+    '''
+    Relative sensitivities: % change of each metric for a 1 % change of
+    each input, comparable between inputs with different units.
+    '''
+    jacobian = sensitivities(cell, anodefree, metrics)
+    inputs = pd.Series({
+        name: (container[key] if isinstance(container, dict) else getattr(container, key))
+        for name, container, key in numeric_inputs(cell)
+    })
+    values = pd.Series({metric: getattr(cell, metric) for metric in metrics})
+    return jacobian.mul(inputs, axis=0).div(values, axis=1)
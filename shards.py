@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+'''
+Sharded energy density sweeps for running one study on many machines.
+
+Every machine runs run_shard with the same sweep definition, its own shard
+index and the shared shard count. Each shard evaluates a deterministic,
+contiguous slice of the sweep points and writes its own output file, no
+coordination between the machines is needed. merge_shards combines the
+files in order and checks that the sweep is complete.
+'''
+
+import glob
+import json
+import os
+
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, chunk_size_for_budget, chunk_slices
+from checkpoint import sweep_id, write_atomic
+from graphs import evaluate_chunk
+
+
+def shard_range(steps, shard_index, shard_count):
+    '''Slice of the sweep points evaluated by one shard'''
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f'Shard index {shard_index} is not in 0..{shard_count - 1}')
+    return slice(
+        steps * shard_index // shard_count,
+        steps * (shard_index + 1) // shard_count,
+    )
+
+
+def shard_path(directory, shard_index, shard_count):
+    return os.path.join(
+        directory, f'shard_{shard_index:05d}_of_{shard_count:05d}.pkl'
+    )
+
+
+def run_shard(
+    cell, parameter, start, end, steps, anodefree, shard_index, shard_count,
+    directory, memory_budget=DEFAULT_MEMORY_BUDGET, precision='float64'
+):
+    '''Evaluates one shard of the sweep and writes it to directory.
+    Returns the path of the shard file.'''
+    os.makedirs(directory, exist_ok=True)
+    points = shard_range(steps, shard_index, shard_count)
+    chunk_size = chunk_size_for_budget(memory_budget, precision)
+
+    chunks = [
+        evaluate_chunk(
+            cell, parameter, start, end, steps, anodefree,
+            slice(points.start + chunk.start, points.start + chunk.stop),
+            precision
+        )
+        for chunk in chunk_slices(points.stop - points.start, chunk_size)
+    ]
+    df = pd.concat(chunks) if chunks else pd.DataFrame()
+
+    path = shard_path(directory, shard_index, shard_count)
+    write_atomic(path, df.to_pickle)
+    # metadata is written last, a shard without it is incomplete
+    meta = {
+        'sweep': sweep_id(cell, parameter, start, end, steps, anodefree, precision),
+        'steps': steps,
+        'shard_index': shard_index,
+        'shard_count': shard_count,
+        'begin': points.start,
+        'stop': points.stop,
+        'rows': len(df),
+    }
+
+    def write(meta_path):
+        with open(meta_path, 'w') as file:
+            json.dump(meta, file, indent=1)
+    write_atomic(path + '.json', write)
+
+    return path
+
+
+def merge_shards(directory):
+    '''
+    Combines all shard files of a directory into one DataFrame ordered as
+    the sweep points. Raises ValueError if shards are missing, incomplete
+    or come from different sweeps.
+    '''
+    metas = []
+    for meta_path in sorted(glob.glob(os.path.join(directory, 'shard_*.pkl.json'))):
+        with open(meta_path) as file:
+            metas.append(json.load(file))
+    if not metas:
+        raise ValueError(f'No shards found in {directory}')
+
+    if len({(m['sweep'], m['shard_count']) for m in metas}) > 1:
+        raise ValueError(f'Shards in {directory} belong to different sweeps')
+    shard_count = metas[0]['shard_count']
+    steps = metas[0]['steps']
+    missing = set(range(shard_count)) - {m['shard_index'] for m in metas}
+    if missing:
+        raise ValueError(f'Missing shards: {sorted(missing)}')
+
+    chunks = []
+    position = 0
+    for meta in sorted(metas, key=lambda m: m['begin']):
+        expected = shard_range(steps, meta['shard_index'], shard_count)
+        if (meta['begin'], meta['stop']) != (expected.start, expected.stop) or meta['begin'] != position:
+            raise ValueError(f'Shard {meta["shard_index"]} does not cover its points')
+        df = pd.read_pickle(shard_path(directory, meta['shard_index'], shard_count))
+        if len(df) != meta['rows'] or meta['rows'] != meta['stop'] - meta['begin']:
+            raise ValueError(f'Shard {meta["shard_index"]} is incomplete')
+        chunks.append(df)
+        position = meta['stop']
+    if position != steps:
+        raise ValueError(f'Shards cover {position} of {steps} points')
+
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+Process-wide de-duplication of identical concurrent computations.
+
+All sessions of the app share one process. When many users open the app
+with the same baseline design, identical sweeps, lookup tables and maps
+would be computed side by side. Computations are keyed by a hash of the
+canonical design and request, the first caller of a key computes and every
+identical call arriving while it runs waits for it and gets a copy of its
+result, so no session can change the result of another.
+
+Sweep jobs stream chunks instead of returning once, so they register as
+the leader of their key instead, and identical jobs follow the chunks of
+the leader (see jobs.SweepJob).
+'''
+
+import threading
+from copy import deepcopy
+
+from cache import cell_state, hash_state
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._leaders = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        '''
+        Calls fn(*args, **kwargs) unless a call with the same key is
+        already running, in which case it waits for that call instead.
+        Returns the result and whether it was shared with another call.
+        Errors are raised in all waiting callers.
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return deepcopy(call.result), True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # followers copy the result, so the caller must not change it meanwhile
+        if call.followers:
+            return deepcopy(call.result), True
+        return call.result, False
+
+    def lead(self, key, value):
+        '''Registers value (e.g. a running job) as the computation of key,
+        unless there is one already. Returns the leader of key.'''
+        with self._lock:
+            return self._leaders.setdefault(key, value)
+
+    def land(self, key, value):
+        '''Removes value as the leader of key once it has finished'''
+        with self._lock:
+            if self._leaders.get(key) is value:
+                del self._leaders[key]
+
+    def in_flight(self):
+        '''Number of keys being computed'''
+        with self._lock:
+            return len(self._calls) + len(self._leaders)
+
+
+# one group for the whole process, shared by all sessions
+FLIGHTS = SingleFlight()
+
+
+def flight_key(cell, **request):
+    '''Hash of the canonical inputs of the cell and the request'''
+    return hash_state({'cell': cell_state(cell), 'request': cell_state(request)})
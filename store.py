@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+'''
+Indexed SQLite store for results of large design studies.
+
+Sweep and batch results are stored with one row per design and one column
+per flattened Cell field (e.g. cathode.thickness) or metric. The metric
+columns share one covering index, so filters like "above 300 Wh/kg, thinner
+than 10 mm and below 2 mL/Ah of electrolyte" are answered from the index
+alone, without loading the study into memory or reading whole rows.
+'''
+
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_PATH = os.path.join('.wattcell_results', 'designs.sqlite')
+
+INDEXED_COLUMNS = [
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+    'energy',
+    'capacity',
+    'total_mass',
+    'total_volume',
+    'total_thickness',
+    'electrolyte.volume_per_ah',
+]
+
+OPERATORS = ['<', '<=', '>', '>=', '=', '!=']
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(dtype):
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return 'INTEGER'
+    # no type affinity, e.g. a column of None stays usable for numbers later
+    return ''
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, index_columns=INDEXED_COLUMNS):
+        self.path = path
+        self.index_columns = index_columns
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # readers don't block the writer of a running study
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS designs '
+                '(id INTEGER PRIMARY KEY, study TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_study ON designs (study)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def columns(self):
+        with self._connect() as conn:
+            return [row[1] for row in conn.execute('PRAGMA table_info(designs)')]
+
+    def update_index(self):
+        '''
+        One index holding all metric columns lets SQLite filter on any
+        combination of them by scanning the index only. SQLite can use just
+        one index per query, so separate indexes would leave all but one
+        filter to slow row lookups.
+        '''
+        columns = [c for c in self.index_columns if c in self.columns()]
+        with self._connect() as conn:
+            indexed = [row[2] for row in conn.execute('PRAGMA index_info(idx_metrics)')]
+            if indexed == columns:
+                return
+            conn.execute('DROP INDEX IF EXISTS idx_metrics')
+            if columns:
+                conn.execute(
+                    'CREATE INDEX idx_metrics ON designs '
+                    f'({", ".join(quote(c) for c in columns)})'
+                )
+                conn.execute('ANALYZE designs')
+
+    def write(self, df, study=''):
+        '''Appends the rows of a flattened results DataFrame'''
+        df = df.reset_index(drop=True).assign(study=study)
+        existing = self.columns()
+        with self._connect() as conn:
+            for name, dtype in df.dtypes.items():
+                if name not in existing:
+                    conn.execute(
+                        f'ALTER TABLE designs ADD COLUMN {quote(name)} {column_type(dtype)}'
+                    )
+            df.to_sql('designs', conn, if_exists='append', index=False, chunksize=10000)
+        self.update_index()
+
+    def _where(self, where):
+        '''SQL condition of (column, operator, value) filters'''
+        existing = self.columns()
+        conditions = []
+        values = []
+        for column, operator, value in where:
+            if column not in existing:
+                raise KeyError(f'Unknown column: {column}')
+            if operator not in OPERATORS:
+                raise ValueError(f'Unknown operator: {operator}')
+            conditions.append(f'{quote(column)} {operator} ?')
+            values.append(value.item() if isinstance(value, np.generic) else value)
+        sql = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return sql, values
+
+    def count(self, where=()):
+        sql, values = self._where(where)
+        with self._connect() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM designs{sql}', values).fetchone()[0]
+
+    def query(
+        self, where=(), columns=None, order_by=None, descending=True, limit=None
+    ):
+        '''
+        Stored designs matching all filters, e.g.
+        where=[('gravimetric_energy_density', '>', 300), ('total_thickness', '<', 10)]
+        '''
+        sql, values = self._where(where)
+        existing = self.columns()
+        for column in (columns or []) + ([order_by] if order_by else []):
+            if column not in existing:
+                raise KeyError(f'Unknown column: {column}')
+        order = ''
+        if order_by:
+            order = f' ORDER BY {quote(order_by)} {"DESC" if descending else "ASC"}'
+        limit = f' LIMIT {int(limit)}' if limit is not None else ''
+        selected = ', '.join(quote(c) for c in columns) if columns else '*'
+        # find matching ids from the index first, then read only those rows
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                f'SELECT {selected} FROM designs WHERE id IN '
+                f'(SELECT id FROM designs{sql}{order}{limit}){order}',
+                conn, params=values
+            )
+
+    def studies(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute('SELECT DISTINCT study FROM designs')]
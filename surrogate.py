@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+'''
+Precomputed lookup tables of the cell model for instant previews.
+
+A table holds the metrics of one base design (format, materials and all
+other inputs) on a dense grid over the common ranges of the cathode
+thickness, porosity, capacity and voltage. Values in between are read by
+multilinear interpolation, which costs microseconds instead of a model
+evaluation. The energy is linear in the voltage, so that axis is exact.
+
+Every table records its error against the exact model, measured at random
+points between the grid nodes. Tables are built ahead of time with
+precompute_tables, stored in a directory and found again by a key of the
+base design, the axes and the model fingerprint. A table stays valid while
+the user moves the axis parameters, any other change needs another table.
+'''
+
+import itertools
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from batch import DEFAULT_MEMORY_BUDGET, chunk_size_for_budget, chunk_slices
+from cache import cell_state, hash_state, model_fingerprint
+from checkpoint import write_atomic
+from graphs import evaluate_parameters
+
+DEFAULT_SURROGATE_DIR = '.wattcell_surrogates'
+
+# parameter: (grid in the units of the sweep parameter, component, field, scale)
+AXES = {
+    'Cathode thickness (um)': (np.linspace(20, 150, 27), 'cathode', 'thickness', 1e4),
+    'Cathode porosity (%)': (np.linspace(10, 50, 17), 'cathode', 'porosity', 100),
+    'Cathode capacity (mAh/g)': (np.linspace(100, 300, 21), 'cathode', 'capacity', 1),
+    'Cathode voltage (V)': (np.linspace(2.5, 5.0, 6), 'cathode', 'voltage', 1),
+}
+
+METRICS = [
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+    'capacity',
+    'energy',
+    'total_mass',
+    'total_volume',
+]
+
+
+@dataclass
+class SurrogateTable:
+    key: str
+    axes: dict  # parameter: grid values
+    values: dict  # metric: array with one dimension per axis
+    errors: dict  # metric: largest and 99th percentile relative error
+
+    def interpolate(self, points):
+        '''
+        Metrics at the points, points maps every axis parameter to values
+        or arrays of values. Points outside the grid give NaN.
+        '''
+        x = np.broadcast_arrays(
+            *[np.asarray(points[name], dtype=float) for name in self.axes]
+        )
+        size = x[0].size
+        lower = []
+        weights = []
+        inside = np.ones(size, dtype=bool)
+        for grid, values in zip(self.axes.values(), x):
+            values = values.ravel()
+            i = np.clip(np.searchsorted(grid, values, side='right') - 1, 0, len(grid) - 2)
+            lower.append(i)
+            weights.append((values - grid[i]) / (grid[i + 1] - grid[i]))
+            inside &= (values >= grid[0]) & (values <= grid[-1])
+
+        results = {}
+        # weighted sum over the 2^d corners of the grid cell of every point
+        corners = list(itertools.product((0, 1), repeat=len(self.axes)))
+        corner_weights = [
+            np.prod([w if c else 1 - w for w, c in zip(weights, corner)], axis=0)
+            for corner in corners
+        ]
+        for metric, table in self.values.items():
+            total = np.zeros(size)
+            for corner, weight in zip(corners, corner_weights):
+                total += weight * table[tuple(i + c for i, c in zip(lower, corner))]
+            results[metric] = np.where(inside, total, np.nan).reshape(x[0].shape)
+        return results
+
+
+def axis_values(cell, axes=AXES):
+    '''Current values of the axis parameters of a cell, in axis units'''
+    return {
+        name: getattr(getattr(cell, component), field) * scale
+        for name, (_, component, field, scale) in axes.items()
+    }
+
+
+def table_key(cell, anodefree, axes=AXES):
+    '''Identifies the base design, the values of the axis parameters don't matter'''
+    state = cell_state(cell)
+    for _, component, field, _ in axes.values():
+        state[component][field] = None
+    return hash_state({
+        'cell': state,
+        'anodefree': anodefree,
+        'axes': {name: grid.tolist() for name, (grid, *_) in axes.items()},
+        'fingerprint': model_fingerprint(),
+    })
+
+
+def evaluate_points(cell, points, anodefree, memory_budget=DEFAULT_MEMORY_BUDGET):
+    '''Exact metrics of flat arrays of parameter values, in chunks'''
+    size = len(next(iter(points.values())))
+    results = {metric: np.empty(size) for metric in METRICS}
+    for chunk in chunk_slices(size, chunk_size_for_budget(memory_budget)):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            evaluated = evaluate_parameters(
+                cell, {name: x[chunk] for name, x in points.items()}, anodefree
+            )
+        for metric in METRICS:
+            results[metric][chunk] = np.broadcast_to(
+                getattr(evaluated, metric), chunk.stop - chunk.start
+            )
+    return results
+
+
+def build_table(cell, anodefree=False, axes=AXES, error_samples=2000, seed=0):
+    '''Evaluates the base design on the whole grid and measures the error
+    of interpolation at random points against the exact model'''
+    grids = [grid for grid, *_ in axes.values()]
+    mesh = np.meshgrid(*grids, indexing='ij')
+    points = {name: m.ravel() for name, m in zip(axes, mesh)}
+    values = {
+        metric: v.reshape(mesh[0].shape)
+        for metric, v in evaluate_points(cell, points, anodefree).items()
+    }
+    table = SurrogateTable(
+        table_key(cell, anodefree, axes), {name: g for name, g in zip(axes, grids)},
+        values, {}
+    )
+
+    rng = np.random.default_rng(seed)
+    samples = {name: rng.uniform(g[0], g[-1], error_samples) for name, g in zip(axes, grids)}
+    exact = evaluate_points(cell, samples, anodefree)
+    approx = table.interpolate(samples)
+    for metric in METRICS:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = np.abs(approx[metric] - exact[metric]) / np.abs(exact[metric])
+        error = error[np.isfinite(error)]
+        table.errors[metric] = {
+            'max': float(error.max()) if error.size else float('nan'),
+            'p99': float(np.percentile(error, 99)) if error.size else float('nan'),
+        }
+    return table
+
+
+def table_path(directory, key):
+    return os.path.join(directory, f'{key}.npz')
+
+
+def save_table(table, directory=DEFAULT_SURROGATE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    arrays = {f'axis_{i}': grid for i, grid in enumerate(table.axes.values())}
+    arrays.update({f'metric_{m}': v for m, v in table.values.items()})
+    meta = {'key': table.key, 'axes': list(table.axes), 'errors': table.errors}
+
+    def write(path):
+        with open(path, 'wb') as file:
+            np.savez_compressed(file, meta=json.dumps(meta), **arrays)
+    path = table_path(directory, table.key)
+    write_atomic(path, write)
+    return path
+
+
+def load_table(key, directory=DEFAULT_SURROGATE_DIR):
+    '''Table with the key, None if it has not been precomputed'''
+    path = table_path(directory, key)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        axes = {name: data[f'axis_{i}'] for i, name in enumerate(meta['axes'])}
+        values = {
+            name[len('metric_'):]: data[name]
+            for name in data.files if name.startswith('metric_')
+        }
+    return SurrogateTable(meta['key'], axes, values, meta['errors'])
+
+
+def precompute_tables(cells, anodefree=False, directory=DEFAULT_SURROGATE_DIR, axes=AXES):
+    '''Builds and saves the tables of base designs, e.g. one per format
+    and chemistry preset, skipping tables that already exist'''
+    paths = []
+    for cell in cells:
+        key = table_key(cell, anodefree, axes)
+        if load_table(key, directory) is None:
+            save_table(build_table(cell, anodefree, axes), directory)
+        paths.append(table_path(directory, key))
+    return paths
+
+
+def preview_sweep(table, cell, parameter, start, end, steps):
+    '''Interpolated counterpart of generate_energy_density_data for a
+    parameter that is an axis of the table'''
+    x_values = np.linspace(start, end, steps)
+    points = axis_values(cell, {name: AXES[name] for name in table.axes})
+    points[parameter] = x_values
+    df = pd.DataFrame(table.interpolate(points))
+    df[parameter] = x_values
+    return df
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Feasibility checks for batches of cell designs.
+
+The model calculates whatever its inputs give, also for designs that can't
+be built, e.g. a jelly roll shorter than the separator turns gives a
+negative cathode length and a can too small for one layer gives zero
+capacity. The checks here find such designs in a whole batch at once.
+
+Every check is a few vectorised comparisons on the flattened columns of a
+design (e.g. cathode.porosity), so the same checks work for a results
+DataFrame and for a cell evaluated with arrays. validate returns one boolean
+column per reason code, True where a design fails that check, and a
+feasible column.
+'''
+
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from batch import cell_columns
+
+TOLERANCE = 1e-6
+
+REASONS = {
+    'porosity': 'Electrode or separator porosity outside 0 - 100 %',
+    'mass_ratio': 'Mass ratios of an electrode are negative or do not sum to 100 %',
+    'electrode_size': 'Electrode thickness, width or height is not positive',
+    'no_layers': 'Fewer than one layer fits in the cell',
+    'n_p_ratio': 'N/P ratio is not positive',
+    'ice': 'Initial coulombic efficiency outside 0 - 100 %',
+    'capacity': 'Cell capacity is not positive',
+    'non_finite': 'Metrics are infinite or not a number',
+}
+
+METRICS = [
+    'gravimetric_energy_density',
+    'volumetric_energy_density',
+    'capacity',
+    'energy',
+    'total_mass',
+    'total_volume',
+]
+
+
+def column(values, name):
+    '''Column of a DataFrame or a flattened cell as a float array,
+    None if the design has no such value'''
+    if name not in values:
+        return None
+    value = values[name]
+    if value is None:
+        return None
+    return np.asarray(value, dtype=float)
+
+
+def outside(values, names, low, high, include_high=False):
+    '''True where any of the columns is outside [low, high)'''
+    failed = False
+    for name in names:
+        value = column(values, name)
+        if value is None:
+            continue
+        above = value > high if include_high else value >= high
+        failed = failed | (value < low) | above
+    return failed
+
+
+def not_positive(values, names):
+    failed = False
+    for name in names:
+        value = column(values, name)
+        if value is not None:
+            failed = failed | ~(value > 0)
+    return failed
+
+
+def mass_ratio_failed(values, electrode):
+    prefix = f'{electrode}.mass_ratio.'
+    ratios = [column(values, name) for name in values if name.startswith(prefix)]
+    ratios = [r for r in ratios if r is not None]
+    if not ratios:
+        return False
+    failed = np.abs(sum(ratios) - 1) > TOLERANCE
+    for ratio in ratios:
+        failed = failed | (ratio < 0)
+    return failed
+
+
+CHECKS = {
+    'porosity': lambda v: outside(
+        v, ['cathode.porosity', 'anode.porosity', 'separator.porosity'], 0, 1
+    ),
+    'mass_ratio': lambda v: mass_ratio_failed(v, 'cathode') | mass_ratio_failed(v, 'anode'),
+    'electrode_size': lambda v: not_positive(v, [
+        'cathode.thickness', 'cathode.width', 'cathode.height',
+        'anode.width', 'anode.height',
+    ]),
+    'no_layers': lambda v: outside(v, ['layers_number'], 1, np.inf),
+    'n_p_ratio': lambda v: not_positive(v, ['n_p_ratio']),
+    'ice': lambda v: outside(v, ['ice'], TOLERANCE, 1, include_high=True),
+    'capacity': lambda v: not_positive(v, ['capacity']),
+    'non_finite': lambda v: reduce(np.logical_or, [
+        ~np.isfinite(value) for value in (column(v, m) for m in METRICS)
+        if value is not None
+    ], False),
+}
+
+
+def validate(values, size=None):
+    '''
+    Runs all checks on a batch of designs. values is a results DataFrame
+    with flattened columns or a dict of flattened cell values, size is the
+    number of designs if values is not a DataFrame.
+    Returns a DataFrame with one boolean column per reason code (True where
+    the design fails) and a feasible column.
+    '''
+    if size is None:
+        size = len(values)
+    index = values.index if isinstance(values, pd.DataFrame) else None
+    with np.errstate(invalid='ignore'):
+        report = pd.DataFrame(
+            {code: np.broadcast_to(check(values), size) for code, check in CHECKS.items()},
+            index=index,
+        )
+    report['feasible'] = ~report[list(CHECKS)].any(axis=1)
+    return report
+
+
+def validate_cell(cell, size=1):
+    '''Checks an evaluated cell, array valued fields give one design each'''
+    return validate(dict(cell_columns(cell)), size)
+
+
+def reasons(report):
+    '''Reason codes of every infeasible design, joined with commas'''
+    failed = report.loc[~report['feasible'], list(CHECKS)]
+    return failed.apply(lambda row: ', '.join(row.index[row]), axis=1)
+
+
+def summary(report):
+    '''Number of designs failing each check'''
+    counts = report[list(CHECKS)].sum()
+    return pd.DataFrame({'designs': counts, 'reason': pd.Series(REASONS)})
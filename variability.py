@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+'''
+Per layer manufacturing variability of stacked cells.
+
+The cell model assumes every layer of a pouch or Z-stacked prismatic cell
+has the nominal coating. Here every electrode sheet of every cell in a
+production lot gets its own deviations, drawn from normal distributions:
+
+    thickness: relative deviation of the coating thickness
+    porosity: absolute deviation of the porosity, changes the coating
+        density and the electrolyte filling its pores
+    loading: relative deviation of the active material loading at a given
+        thickness and porosity, e.g. from the slurry composition, changes
+        the capacity but not the mass
+
+Both sides of a sheet share its deviations. A stack of L cathode sheets
+has L + 1 anode sheets and every cathode side faces one anode side, so a
+cell has 2L interfaces, each with its local N/P ratio. A cell's capacity is
+the sum over its interfaces of the smaller of the two facing capacities,
+which is the nominal capacity without deviations and N/P >= 1.
+
+A lot is simulated as cell x layer arrays in chunks, 10^5 cells of 40
+layers take a few seconds.
+'''
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from batch import chunk_slices
+from cell_components import Pouch, Prismatic
+from validation import validate_cell
+
+# elements of one cell x layer array evaluated at once
+CHUNK_ELEMENTS = 1_000_000
+
+PERCENTILES = [1, 5, 50, 95, 99]
+
+
+@dataclass
+class Variability:
+    '''Standard deviations of the per sheet deviations of one electrode'''
+    thickness: float = 0.0  # fraction of the thickness
+    porosity: float = 0.0  # absolute, e.g. 0.01 for 1 % points
+    loading: float = 0.0  # fraction of the active material loading
+
+
+@dataclass
+class Lot:
+    '''Metrics of every cell of a simulated production lot'''
+    capacity: np.ndarray  # Ah
+    energy: np.ndarray  # Wh
+    total_mass: np.ndarray  # g
+    total_volume: np.ndarray  # cm3
+    min_n_p_ratio: np.ndarray  # smallest local N/P ratio of each cell
+    nominal: dict = field(default_factory=dict)  # metrics of the nominal cell
+
+    @property
+    def gravimetric_energy_density(self):
+        return self.energy / self.total_mass * 1000  # Wh/kg
+
+    @property
+    def volumetric_energy_density(self):
+        return self.energy / self.total_volume * 1000  # Wh/L
+
+    @property
+    def low_n_p_share(self):
+        '''Share of cells with a local N/P ratio below 1 somewhere'''
+        return float(np.mean(self.min_n_p_ratio < 1))
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'capacity': self.capacity,
+            'energy': self.energy,
+            'total_mass': self.total_mass,
+            'total_volume': self.total_volume,
+            'gravimetric_energy_density': self.gravimetric_energy_density,
+            'volumetric_energy_density': self.volumetric_energy_density,
+            'min_n_p_ratio': self.min_n_p_ratio,
+        })
+
+    def summary(self, percentiles=PERCENTILES):
+        '''Nominal value, mean, standard deviation and percentiles of every metric'''
+        df = self.to_frame()
+        rows = {}
+        for metric in df:
+            values = df[metric].to_numpy()
+            rows[metric] = {
+                'nominal': self.nominal.get(metric, np.nan),
+                'mean': values.mean(),
+                'std': values.std(),
+                **{f'p{p}': v for p, v in zip(percentiles, np.percentile(values, percentiles))},
+            }
+        return pd.DataFrame(rows).T
+
+
+def is_stacked(cell):
+    return isinstance(cell.format, Pouch) or (
+        isinstance(cell.format, Prismatic) and cell.format.structure == 'Z-stacked'
+    )
+
+
+def sheets(electrode, variability, size, rng):
+    '''Thickness (cm), density (g/cm3), porosity and areal capacity
+    (mAh/cm2, one side) of cell x sheet arrays of one electrode'''
+    solid_density = electrode.density / (1 - electrode.porosity)
+    thickness = electrode.thickness * (1 + variability.thickness * rng.standard_normal(size))
+    thickness = np.clip(thickness, 0, None)
+    porosity = electrode.porosity + variability.porosity * rng.standard_normal(size)
+    porosity = np.clip(porosity, 0, 1)
+    density = solid_density * (1 - porosity)
+    loading = np.clip(1 + variability.loading * rng.standard_normal(size), 0, None)
+    areal_capacity = (
+        density * thickness * electrode.mass_ratio['am'] * electrode.capacity * loading
+    )
+    return thickness, density, porosity, areal_capacity
+
+
+def simulate_lot(cell, cells=10_000, cathode=None, anode=None, seed=0):
+    '''
+    Simulates a lot of cells of an evaluated pouch or Z-stacked prismatic
+    design with per sheet deviations of the cathode and anode coatings
+    (Variability, none by default). Returns a Lot.
+    '''
+    if not is_stacked(cell):
+        raise ValueError('Layer variability needs a pouch or Z-stacked prismatic cell')
+    if np.ndim(cell.total_mass) or np.ndim(cell.layers_number):
+        raise ValueError('Layer variability needs a single design, not arrays of designs')
+    if not validate_cell(cell)['feasible'].iloc[0]:
+        raise ValueError('Layer variability needs a feasible design')
+    cathode = cathode or Variability()
+    anode = anode or Variability()
+    rng = np.random.default_rng(seed)
+
+    layers = int(cell.layers_number)
+    cathode_area = cell.cathode.width * cell.cathode.height
+    anode_area = cell.anode.width * cell.anode.height
+    electrolyte_factor = (1 + cell.electrolyte.volume_excess) * cell.electrolyte.density
+    voltage = cell.cathode.voltage - cell.anode.voltage
+    masses = cell.mass_breakdown
+    volumes = cell.volume_breakdown
+    # everything but the coatings and the electrolyte is the same in all cells
+    fixed_mass = cell.total_mass - masses['cathode'] - masses['anode'] - masses['electrolyte']
+    fixed_volume = (
+        cell.total_volume - volumes['cathode'] - volumes['anode'] - volumes['electrolyte']
+    )
+    separator_pores = (
+        volumes['separator'] * cell.separator.porosity
+    )
+
+    capacity = np.empty(cells)
+    total_mass = np.empty(cells)
+    total_volume = np.empty(cells)
+    min_n_p = np.empty(cells)
+    chunk_size = max(1, CHUNK_ELEMENTS // (layers + 1))
+    for chunk in chunk_slices(cells, chunk_size):
+        n = chunk.stop - chunk.start
+        c_thickness, c_density, c_porosity, c_capacity = sheets(
+            cell.cathode, cathode, (n, layers), rng
+        )
+        a_thickness, a_density, a_porosity, a_capacity = sheets(
+            cell.anode, anode, (n, layers + 1), rng
+        )
+
+        # cathode sheet i faces anode sheets i and i + 1
+        facing = np.stack([a_capacity[:, :-1], a_capacity[:, 1:]])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            min_n_p[chunk] = (facing / c_capacity).min(axis=(0, 2))
+        capacity[chunk] = (
+            np.minimum(facing, c_capacity).sum(axis=(0, 2)) * cathode_area / 1000 * cell.ice
+        )  # Ah
+
+        # both sides of every sheet
+        c_volume = 2 * cathode_area * c_thickness
+        a_volume = 2 * anode_area * a_thickness
+        pores = (c_volume * c_porosity).sum(axis=1) + (a_volume * a_porosity).sum(axis=1)
+        electrolyte_mass = (pores + separator_pores) * electrolyte_factor
+        total_mass[chunk] = (
+            fixed_mass
+            + (c_volume * c_density).sum(axis=1)
+            + (a_volume * a_density).sum(axis=1)
+            + electrolyte_mass
+        )
+        if isinstance(cell.format, Pouch):
+            excess = (pores + separator_pores) * cell.electrolyte.volume_excess
+            total_volume[chunk] = (
+                fixed_volume + c_volume.sum(axis=1) + a_volume.sum(axis=1) + excess
+            )
+        else:
+            # the can keeps its size
+            total_volume[chunk] = cell.total_volume
+
+    return Lot(
+        capacity=capacity,
+        energy=capacity * voltage,
+        total_mass=total_mass,
+        total_volume=total_volume,
+        min_n_p_ratio=min_n_p,
+        nominal={
+            'capacity': float(cell.capacity),
+            'energy': float(cell.energy),
+            'total_mass': float(cell.total_mass),
+            'total_volume': float(cell.total_volume),
+            'gravimetric_energy_density': float(cell.gravimetric_energy_density),
+            'volumetric_energy_density': float(cell.volumetric_energy_density),
+            'min_n_p_ratio': float(cell.n_p_ratio),
+        },
+    )
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''
+Copy-on-write variants of a cell design.
+
+A variant is a base cell plus a small map of overridden inputs, dotted
+names as in the results (e.g. cathode.thickness, cathode.mass_ratio.am or
+format for a whole component), with values or arrays of values.
+
+Evaluating a variant doesn't clone the object graph of the base. The cell
+and only the components the calculations write derived values to (the
+electrodes, separator and electrolyte) or that are overridden are copied
+shallowly, everything else is shared. The base is never modified, so any
+number of variants of one base can be evaluated at the same time, e.g. by
+several sessions or worker threads.
+'''
+
+from copy import copy
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# components the calculations write derived values to, e.g. the anode
+# thickness, the jelly roll electrode widths or the electrolyte volume
+DERIVED_COMPONENTS = ['cathode', 'anode', 'separator', 'electrolyte']
+
+
+def get_field(cell, name):
+    '''Value of a dotted field of a cell, e.g. mass_breakdown.casing'''
+    value = cell
+    for part in name.split('.'):
+        value = value[part] if isinstance(value, dict) else getattr(value, part)
+    return value
+
+
+def set_field(cell, name, value):
+    '''Sets a dotted field of a cell, e.g. cathode.mass_ratio.am'''
+    *path, key = name.split('.')
+    container = cell
+    for part in path:
+        container = container[part] if isinstance(container, dict) else getattr(container, part)
+    if isinstance(container, dict):
+        container[key] = value
+    else:
+        setattr(container, key, value)
+
+
+def variant_cell(base, overrides):
+    '''Unevaluated cell with the overrides applied, sharing all components
+    that are neither overridden nor written by the calculations with base'''
+    cell = copy(base)
+    components = set(DERIVED_COMPONENTS)
+    components.update(name.split('.')[0] for name in overrides)
+    for name in components:
+        setattr(cell, name, copy(getattr(base, name)))
+
+    for name in overrides:
+        parts = name.split('.')
+        if len(parts) == 3:
+            # mass ratios of an electrode are a dict, copy it before writing
+            component = getattr(cell, parts[0])
+            setattr(component, parts[1], dict(getattr(component, parts[1])))
+    for name, value in overrides.items():
+        set_field(cell, name, value)
+
+    if 'tabs' in components:
+        # tab densities are looked up from the tab materials
+        cell.tabs.__post_init__()
+    return cell
+
+
+def evaluate_electrodes(cell):
+    '''Evaluates the electrode properties that don't depend on the format,
+    e.g. the composite densities and the anode thickness'''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cell.cathode.calculate_composite_density()
+        cell.cathode.calculate_areal_capacity()
+        cell.cathode.calculate_am_mass_loading()
+        cell.anode.calculate_composite_density()
+        cell.calculate_anode_properties()
+
+
+def evaluate_variant(base, overrides, anodefree=False):
+    '''Evaluated variant of base, invalid designs (e.g. zero capacity)
+    give inf or nan instead of raising'''
+    cell = variant_cell(base, overrides)
+    evaluate_electrodes(cell)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cell.calculate_energy_density()
+        if anodefree:
+            cell.anode_free_energy()
+    return cell
+
+
+@dataclass(frozen=True)
+class Variant:
+    '''A base design and the inputs that differ from it'''
+    base: object
+    overrides: dict = field(default_factory=dict)
+
+    def evaluate(self, anodefree=False):
+        return evaluate_variant(self.base, self.overrides, anodefree)
+